@@ -39,7 +39,9 @@ setup(
     include_package_data=True,
     zip_safe=False,
 
+    python_requires='>=3.7',
     install_requires=[
+        'django >= 3.1',
         'django-etc >= 1.2.0',
     ],
     setup_requires=[] + (['pytest-runner'] if 'test' in sys.argv else []),
@@ -48,6 +50,7 @@ setup(
     tests_require=[
         'pytest',
         'pytest-djangoapp>=0.15.1',
+        'pytest-benchmark',
     ],
 
     classifiers=[
@@ -59,7 +62,6 @@ setup(
         'Operating System :: OS Independent',
         'Programming Language :: Python',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.6',
         'Programming Language :: Python :: 3.7',
         'Programming Language :: Python :: 3.8',
         'Programming Language :: Python :: 3.9',
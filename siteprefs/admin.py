@@ -12,6 +12,12 @@ if EXPOSE_MODEL_TO_ADMIN:
         search_fields = ['app', 'name']
         list_filter = ['app']
         ordering = ['app', 'name']
+        exclude = ['data']
+
+        def save_model(self, request, obj, form, change):
+            if 'text' in form.changed_data:
+                obj.data = None  # Text is now the source of truth.
+            super().save_model(request, obj, form, change)
 
 
     admin.site.register(Preference, PreferenceAdmin)
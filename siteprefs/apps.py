@@ -1,7 +1,8 @@
 from django.apps import AppConfig
+from django.utils.module_loading import import_string
 from django.utils.translation import gettext_lazy as _
 
-from .settings import DISABLE_AUTODISCOVER
+from .settings import DISABLE_AUTODISCOVER, METRICS_CALLBACK, COUNT_READS, REFRESH_INTERVAL
 
 
 class SiteprefsConfig(AppConfig):
@@ -12,8 +13,18 @@ class SiteprefsConfig(AppConfig):
 
     def ready(self):
 
-        if DISABLE_AUTODISCOVER:
-            return
+        from .metrics import set_metrics_callback, enable_reads_counting
 
-        from .toolbox import autodiscover_siteprefs
-        autodiscover_siteprefs()
+        if METRICS_CALLBACK:
+            set_metrics_callback(import_string(METRICS_CALLBACK))
+
+        if COUNT_READS:
+            enable_reads_counting()
+
+        if not DISABLE_AUTODISCOVER:
+            from .toolbox import autodiscover_siteprefs
+            autodiscover_siteprefs()
+
+        if REFRESH_INTERVAL:
+            from .refresher import start_refresher_on_request
+            start_refresher_on_request()
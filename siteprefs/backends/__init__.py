@@ -0,0 +1,34 @@
+from typing import Optional
+
+from django.utils.module_loading import import_string
+
+from .base import PrefsBackend
+from ..settings import BACKEND, BACKEND_OPTIONS
+
+__BACKEND: Optional[PrefsBackend] = None
+
+
+def get_backend() -> PrefsBackend:
+    """Returns preferences values storage backend configured
+    by SITEPREFS_BACKEND and SITEPREFS_BACKEND_OPTIONS settings
+    or set by ``set_backend()``.
+
+    """
+    global __BACKEND
+
+    backend = __BACKEND
+
+    if backend is None:
+        backend = __BACKEND = import_string(BACKEND)(**BACKEND_OPTIONS)
+
+    return backend
+
+
+def set_backend(backend: Optional[PrefsBackend]):
+    """Sets preferences values storage backend.
+
+    :param backend: Backend object or None to use the configured one.
+
+    """
+    global __BACKEND
+    __BACKEND = backend
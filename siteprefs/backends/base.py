@@ -0,0 +1,277 @@
+import json
+from typing import Optional, Type, Dict, Any, List, Tuple, Iterable
+
+from asgiref.sync import sync_to_async
+from django.db.models import Model
+
+from ..utils import publish_values, get_dynamic_prefs, PreciseJSONEncoder
+
+AppsValues = Dict[str, Dict[str, Any]]
+
+
+class PrefsBackend:
+    """Base class for preferences values storages.
+
+    A storage keeps values of dynamic preferences and a version number
+    which is incremented on every change of those values.
+
+    Read methods apply values to preferences proxies (see ``publish_values()``).
+
+    """
+    model: Optional[Type[Model]] = None
+    """Model to count queries against in metrics (see ``siteprefs.metrics.measure()``)."""
+
+    def get_version(self) -> int:
+        """Returns current version of stored values."""
+        raise NotImplementedError
+
+    async def aget_version(self) -> int:
+        """Asynchronous version of ``get_version()``."""
+        return await sync_to_async(self.get_version)()
+
+    def read_prefs(self, mem_prefs: dict, version: int = None) -> int:
+        """Reads values of all dynamic preferences initializing missing entries with defaults.
+        Returns the number of entries read.
+
+        :param mem_prefs: Preferences dictionary indexed by application names and preferences names.
+
+        :param version: Current version of stored values if already known by the caller.
+
+        """
+        raise NotImplementedError
+
+    async def aread_prefs(self, mem_prefs: dict, version: int = None) -> int:
+        """Asynchronous version of ``read_prefs()``.
+
+        :param mem_prefs: Preferences dictionary indexed by application names and preferences names.
+
+        :param version: Current version of stored values if already known by the caller.
+
+        """
+        return await sync_to_async(self.read_prefs)(mem_prefs, version=version)
+
+    def read_app_prefs(self, app: str, app_prefs: dict, names: Iterable[str] = None) -> int:
+        """Reads values of preferences of a certain app.
+        Returns the number of entries read.
+
+        :param app: Application name.
+
+        :param app_prefs: Application preferences dictionary.
+
+        :param names: Read only preferences with the given names.
+
+        """
+        raise NotImplementedError
+
+    async def aread_app_prefs(self, app: str, app_prefs: dict, names: Iterable[str] = None) -> int:
+        """Asynchronous version of ``read_app_prefs()``.
+
+        :param app: Application name.
+
+        :param app_prefs: Application preferences dictionary.
+
+        :param names: Read only preferences with the given names.
+
+        """
+        return await sync_to_async(self.read_app_prefs)(app, app_prefs, names)
+
+    def write_prefs(self, values: AppsValues, create: bool = False, batch_size: int = None) -> List[Tuple[str, str]]:
+        """Writes values differing from stored ones and increments version if any.
+        Returns (app, name) pairs of changed preferences.
+
+        :param values: Values indexed by application names and preferences names.
+
+        :param create: Create entries missing in storage.
+
+        :param batch_size: Max number of entries to write at once.
+
+        """
+        raise NotImplementedError
+
+    async def awrite_prefs(
+            self,
+            values: AppsValues,
+            create: bool = False,
+            batch_size: int = None
+    ) -> List[Tuple[str, str]]:
+        """Asynchronous version of ``write_prefs()``.
+
+        :param values: Values indexed by application names and preferences names.
+
+        :param create: Create entries missing in storage.
+
+        :param batch_size: Max number of entries to write at once.
+
+        """
+        return await sync_to_async(self.write_prefs)(values, create, batch_size)
+
+    def read_changes(self, mem_prefs: dict, since_version: int, version: int) -> Optional[int]:
+        """Reads only values changed after one version up to another.
+        Returns the number of entries read or None if changes are unknown
+        and thus all values are to be reread. Changes are unknown by default.
+
+        :param mem_prefs: Preferences dictionary indexed by application names and preferences names.
+
+        :param since_version: Version seen last.
+
+        :param version: Current version.
+
+        """
+        return None
+
+    async def aread_changes(self, mem_prefs: dict, since_version: int, version: int) -> Optional[int]:
+        """Asynchronous version of ``read_changes()``.
+
+        :param mem_prefs: Preferences dictionary indexed by application names and preferences names.
+
+        :param since_version: Version seen last.
+
+        :param version: Current version.
+
+        """
+        return await sync_to_async(self.read_changes)(mem_prefs, since_version, version)
+
+    def dump(self, apps: Iterable[str] = None) -> Iterable[Tuple[str, str, Any]]:
+        """Yields (app, name, value) of stored preferences ordered by apps and names.
+
+        :param apps: Applications to dump values of. Default: all.
+
+        """
+        raise NotImplementedError
+
+
+class KeyValueBackend(PrefsBackend):
+    """Base for storages keeping values of every app together,
+    e.g. under a key in a key-value store.
+
+    Values are stored as given (not converted to text)
+    and are expected to be JSON serializable.
+
+    """
+    @staticmethod
+    def is_same(stored: Any, value: Any) -> bool:
+        """Returns boolean indicating whether a stored value is the same as the given one.
+
+        Stored values may come back JSON decoded (e.g. datetimes and decimals as strings),
+        so values are compared in JSON form if they differ.
+
+        :param stored: Stored value.
+
+        :param value: Value to compare with.
+
+        """
+        if stored == value:
+            return True
+
+        try:
+            return json.dumps(stored, cls=PreciseJSONEncoder) == json.dumps(value, cls=PreciseJSONEncoder)
+
+        except (TypeError, ValueError):
+            return False
+
+    def get_apps_values(self, apps: Iterable[str]) -> AppsValues:
+        """Returns stored values of the given apps indexed by application names and preferences names.
+        Apps having no values stored are omitted.
+
+        :param apps: Application names.
+
+        """
+        raise NotImplementedError
+
+    def set_apps_values(self, values: AppsValues, bump: bool = True):
+        """Stores all values of the given apps.
+
+        :param values: Values indexed by application names and preferences names.
+
+        :param bump: Increment version.
+
+        """
+        raise NotImplementedError
+
+    def get_apps(self) -> List[str]:
+        """Returns names of applications having values stored."""
+        from ..toolbox import get_prefs
+        return list(get_prefs())
+
+    def read_prefs(self, mem_prefs: dict, version: int = None) -> int:
+        dynamic = get_dynamic_prefs(mem_prefs)
+
+        if not dynamic:
+            return 0
+
+        stored = self.get_apps_values(dynamic)
+
+        updates = []
+        missing = {}
+
+        for app, prefs in dynamic.items():
+            app_stored = stored.get(app, {})
+
+            for pref_name, pref_proxy in prefs.items():
+
+                if pref_name in app_stored:
+                    updates.append((pref_proxy, app_stored[pref_name]))
+
+                else:
+                    missing.setdefault(app, dict(app_stored))[pref_name] = pref_proxy.default
+
+        publish_values(updates)
+
+        if missing:
+            self.set_apps_values(missing, bump=False)
+
+        return len(updates)
+
+    def read_app_prefs(self, app: str, app_prefs: dict, names: Iterable[str] = None) -> int:
+        if names is None:
+            names = list(app_prefs)
+
+        app_stored = self.get_apps_values([app]).get(app, {})
+
+        updates = [
+            (app_prefs[pref_name], app_stored[pref_name])
+            for pref_name in names
+            if pref_name in app_stored and pref_name in app_prefs and not app_prefs[pref_name].static
+        ]
+
+        publish_values(updates)
+
+        return len(updates)
+
+    def write_prefs(self, values: AppsValues, create: bool = False, batch_size: int = None) -> List[Tuple[str, str]]:
+        stored = self.get_apps_values(values)
+
+        changed = []
+        changed_apps = {}
+
+        for app, app_values in values.items():
+            app_stored = stored.get(app, {})
+
+            for pref_name, value in app_values.items():
+
+                if pref_name not in app_stored:
+                    if not create:
+                        continue
+
+                elif self.is_same(app_stored[pref_name], value):
+                    continue
+
+                changed_apps.setdefault(app, dict(app_stored))[pref_name] = value
+                changed.append((app, pref_name))
+
+        if changed_apps:
+            self.set_apps_values(changed_apps)
+
+        return changed
+
+    def dump(self, apps: Iterable[str] = None) -> Iterable[Tuple[str, str, Any]]:
+        if apps is None:
+            apps = self.get_apps()
+
+        stored = self.get_apps_values(apps)
+
+        for app in sorted(stored):
+            app_stored = stored[app]
+
+            for pref_name in sorted(app_stored):
+                yield app, pref_name, app_stored[pref_name]
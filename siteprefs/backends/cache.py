@@ -0,0 +1,71 @@
+from typing import Iterable, List
+
+from django.core.cache import caches, BaseCache
+
+from .base import KeyValueBackend, AppsValues
+
+
+class CacheBackend(KeyValueBackend):
+    """Stores values in Django cache. Values of every app are stored under one key.
+
+    Use a cache not evicting entries (e.g. Redis with ``noeviction`` policy),
+    otherwise evicted values are reset to defaults.
+
+    """
+    def __init__(self, alias: str = 'default', prefix: str = 'siteprefs', timeout: float = None):
+        """
+
+        :param alias: Cache alias from CACHES setting.
+
+        :param prefix: Keys prefix.
+
+        :param timeout: Keys timeout in seconds. Default: keys never expire.
+
+        """
+        self.alias = alias
+        self.prefix = prefix
+        self.timeout = timeout
+
+    @property
+    def cache(self) -> BaseCache:
+        return caches[self.alias]
+
+    def get_key(self, app: str) -> str:
+        """Returns cache key for values of the given app.
+
+        :param app: Application name.
+
+        """
+        return f'{self.prefix}:app:{app}'
+
+    def get_version(self) -> int:
+        return self.cache.get(f'{self.prefix}:version', 0)
+
+    def get_apps(self) -> List[str]:
+        return sorted(self.cache.get(f'{self.prefix}:apps', []))
+
+    def get_apps_values(self, apps: Iterable[str]) -> AppsValues:
+        keys = {self.get_key(app): app for app in apps}
+        return {keys[key]: app_values for key, app_values in self.cache.get_many(list(keys)).items()}
+
+    def set_apps_values(self, values: AppsValues, bump: bool = True):
+        cache = self.cache
+        timeout = self.timeout
+
+        cache.set_many({self.get_key(app): app_values for app, app_values in values.items()}, timeout)
+
+        key_apps = f'{self.prefix}:apps'
+        apps = set(cache.get(key_apps, []))
+
+        if not apps.issuperset(values):
+            cache.set(key_apps, sorted(apps.union(values)), timeout)
+
+        if bump:
+            key_version = f'{self.prefix}:version'
+
+            try:
+                cache.incr(key_version)
+
+            except ValueError:  # No key yet.
+                if not cache.add(key_version, 1, timeout):
+                    cache.incr(key_version)
@@ -0,0 +1,148 @@
+from collections import defaultdict
+from functools import partial
+from typing import List, Tuple, Set
+
+from django.core.cache import caches, BaseCache
+from django.db import transaction
+
+from .base import PrefsBackend, AppsValues
+from .db import DatabaseBackend
+from ..models import Preference, Generation
+from ..utils import publish_values, get_dynamic_prefs
+
+
+class CachedDatabaseBackend(DatabaseBackend):
+    """Stores values in DB and caches them using Django cache framework.
+
+    Values of every app are cached under one key including preferences
+    generation, so that values of all apps are read with one ``get_many()``
+    and entries of older generations are never used.
+
+    Read-through: apps missing in cache are read from DB and put into cache.
+
+    Write-through: on write, cache entries for the new generation are put
+    for changed apps and copied from the previous generation for the others.
+
+    """
+    def __init__(self, alias: str = 'default', prefix: str = 'siteprefs', timeout: float = 86400):
+        """
+
+        :param alias: Cache alias from CACHES setting.
+
+        :param prefix: Keys prefix.
+
+        :param timeout: Keys timeout in seconds. Entries of older generations are left to expire.
+
+        """
+        self.alias = alias
+        self.prefix = prefix
+        self.timeout = timeout
+
+    @property
+    def cache(self) -> BaseCache:
+        return caches[self.alias]
+
+    def get_key(self, generation: int, app: str) -> str:
+        """Returns cache key for values of the given app.
+
+        :param generation: Preferences generation number.
+
+        :param app: Application name.
+
+        """
+        return f'{self.prefix}:{generation}:{app}'
+
+    def get_cached(self, generation: int, apps: List[str]) -> AppsValues:
+        """Returns values of the given apps cached for the given generation
+        indexed by application names and preferences names. Apps not in cache are omitted.
+
+        :param generation: Preferences generation number.
+
+        :param apps: Application names.
+
+        """
+        keys = {self.get_key(generation, app): app for app in apps}
+        return {keys[key]: app_values for key, app_values in self.cache.get_many(list(keys)).items()}
+
+    def read_prefs(self, mem_prefs: dict, version: int = None) -> int:
+        dynamic = get_dynamic_prefs(mem_prefs)
+
+        if not dynamic:
+            return 0
+
+        generation = Generation.get_value() if version is None else version
+        cached = self.get_cached(generation, list(dynamic))
+
+        # Apps having preferences registered after they were cached are read from DB too,
+        # so that entries for new preferences are created.
+        missing = {
+            app: prefs for app, prefs in dynamic.items()
+            if app not in cached or not cached[app].keys() >= prefs.keys()
+        }
+
+        updates = [
+            (pref_proxy, cached[app][pref_name])
+            for app in cached
+            if app not in missing
+            for pref_name, pref_proxy in dynamic[app].items()
+        ]
+
+        publish_values(updates)
+
+        if not missing:
+            return len(updates)
+
+        rows = super().read_prefs(missing)
+
+        self.cache.set_many(
+            {
+                self.get_key(generation, app): {
+                    pref_name: getattr(pref_proxy, 'db_value', pref_proxy.default)
+                    for pref_name, pref_proxy in prefs.items()
+                }
+                for app, prefs in missing.items()
+            },
+            self.timeout
+        )
+
+        return len(updates) + rows
+
+    async def aread_prefs(self, mem_prefs: dict, version: int = None) -> int:
+        # Cache is read synchronously.
+        return await PrefsBackend.aread_prefs(self, mem_prefs, version=version)
+
+    def write_prefs(self, values: AppsValues, create: bool = False, batch_size: int = None) -> List[Tuple[str, str]]:
+
+        with transaction.atomic():
+            changed = super().write_prefs(values, create=create, batch_size=batch_size)
+
+            if changed:
+                # Generation row is locked by the write until commit, so this is our generation.
+                generation = Generation.get_value()
+                transaction.on_commit(partial(self._cache_written, generation, {app for app, _ in changed}))
+
+        return changed
+
+    def _cache_written(self, generation: int, changed_apps: Set[str]):
+        from ..toolbox import get_prefs
+
+        apps = [app for app in get_dynamic_prefs(get_prefs()) if app not in changed_apps]
+
+        entries = {
+            self.get_key(generation, app): app_values
+            for app, app_values in self.get_cached(generation - 1, apps).items()
+        }
+
+        rows = Preference.objects.filter(
+            app__in=list(changed_apps)
+        ).order_by().values_list('app', 'name', 'text', 'data').iterator()
+
+        changed_values = defaultdict(dict)
+
+        for app, pref_name, text, data in rows:
+            changed_values[app][pref_name] = text if data is None else data
+
+        for app, app_values in changed_values.items():
+            entries[self.get_key(generation, app)] = app_values
+
+        self.cache.set_many(entries, self.timeout)
@@ -0,0 +1,50 @@
+from typing import Optional, List, Tuple, Iterable, Any
+
+from .base import PrefsBackend, AppsValues
+from ..models import Preference, Generation, PreferenceChange
+
+
+class DatabaseBackend(PrefsBackend):
+    """Stores values in DB using siteprefs models. This is the default.
+
+    Changed values are also logged (see ``PreferenceChange``),
+    so that only changes could be read on refresh.
+
+    """
+    model = Preference
+
+    def get_version(self) -> int:
+        return Generation.get_value()
+
+    async def aget_version(self) -> int:
+        return await Generation.aget_value()
+
+    def read_prefs(self, mem_prefs: dict, version: int = None) -> int:
+        return Preference.read_prefs(mem_prefs)
+
+    async def aread_prefs(self, mem_prefs: dict, version: int = None) -> int:
+        return await Preference.aread_prefs(mem_prefs)
+
+    def read_app_prefs(self, app: str, app_prefs: dict, names: Iterable[str] = None) -> int:
+        return Preference.read_app_prefs(app, app_prefs, names=names)
+
+    async def aread_app_prefs(self, app: str, app_prefs: dict, names: Iterable[str] = None) -> int:
+        return await Preference.aread_app_prefs(app, app_prefs, names=names)
+
+    def write_prefs(self, values: AppsValues, create: bool = False, batch_size: int = None) -> List[Tuple[str, str]]:
+        return Preference.write_prefs(values, create=create, batch_size=batch_size)
+
+    def read_changes(self, mem_prefs: dict, since_version: int, version: int) -> Optional[int]:
+        return PreferenceChange.read_changes(mem_prefs, since_version, version)
+
+    async def aread_changes(self, mem_prefs: dict, since_version: int, version: int) -> Optional[int]:
+        return await PreferenceChange.aread_changes(mem_prefs, since_version, version)
+
+    def dump(self, apps: Iterable[str] = None) -> Iterable[Tuple[str, str, Any]]:
+        rows = Preference.objects.order_by('app', 'name')
+
+        if apps is not None:
+            rows = rows.filter(app__in=list(apps))
+
+        for app, pref_name, text, data in rows.values_list('app', 'name', 'text', 'data').iterator():
+            yield app, pref_name, text if data is None else data
@@ -0,0 +1,89 @@
+import json
+import logging
+import os
+from tempfile import mkstemp
+from typing import Iterable, List, Tuple
+
+from .base import KeyValueBackend, AppsValues
+from ..utils import PreciseJSONEncoder
+
+LOGGER = logging.getLogger(__name__)
+
+
+class FileBackend(KeyValueBackend):
+    """Stores values in a local JSON file:
+
+    .. code-block:: json
+
+        {"version": 1, "values": {"myapp": {"my_option": true}}}
+
+    A new file atomically replaces the previous one on every write.
+    Suitable for single host deployments and development: concurrent writes
+    of different processes may overwrite each other.
+
+    """
+    def __init__(self, path: str):
+        """
+
+        :param path: File path.
+
+        """
+        self.path = path
+        self._cached = (None, 0, {})
+
+    def _read(self) -> Tuple[int, AppsValues]:
+        try:
+            stat = os.stat(self.path)
+
+        except FileNotFoundError:
+            return 0, {}
+
+        stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        stamp_cached, version, values = self._cached
+
+        if stamp != stamp_cached:
+            try:
+                with open(self.path) as f:
+                    contents = json.load(f)
+
+                version, values = contents['version'], contents['values']
+
+            except (ValueError, KeyError, TypeError):
+                LOGGER.warning('Unable to read preferences file %s. No values are used.', self.path)
+                version, values = 0, {}
+
+            self._cached = (stamp, version, values)
+
+        return version, values
+
+    def get_version(self) -> int:
+        return self._read()[0]
+
+    def get_apps(self) -> List[str]:
+        return sorted(self._read()[1])
+
+    def get_apps_values(self, apps: Iterable[str]) -> AppsValues:
+        values = self._read()[1]
+        return {app: values[app] for app in apps if app in values}
+
+    def set_apps_values(self, values: AppsValues, bump: bool = True):
+        version, values_stored = self._read()
+
+        contents = {
+            'version': version + 1 if bump else version,
+            'values': {**values_stored, **values},
+        }
+
+        fd, path_tmp = mkstemp(dir=os.path.dirname(self.path) or None, suffix='.tmp')
+
+        try:
+            os.fchmod(fd, 0o644)
+
+            with os.fdopen(fd, 'w') as f:
+                json.dump(contents, f, cls=PreciseJSONEncoder)
+
+            os.replace(path_tmp, self.path)
+
+        except BaseException:
+            os.unlink(path_tmp)
+            raise
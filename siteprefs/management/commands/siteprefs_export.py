@@ -0,0 +1,38 @@
+import json
+
+from django.core.management import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+
+from ...backends import get_backend
+
+
+class Command(BaseCommand):
+
+    help = 'Exports stored preferences values as JSON lines: {"app": ..., "name": ..., "value": ...}'
+
+    def add_arguments(self, parser):
+        parser.add_argument('apps', nargs='*', help='Applications to export preferences of. Default: all.')
+        parser.add_argument('-o', '--output', help='File to write into. Default: stdout.')
+
+    def handle(self, *args, **options):
+        apps = options['apps']
+        output = options['output']
+
+        rows = get_backend().dump(apps or None)
+
+        stream = open(output, 'w') if output else self.stdout
+
+        exported = 0
+
+        try:
+            for app, pref_name, value in rows:
+                line = json.dumps({'app': app, 'name': pref_name, 'value': value}, cls=DjangoJSONEncoder)
+                stream.write(line + '\n')
+                exported += 1
+
+        finally:
+            if output:
+                stream.close()
+
+        if output:
+            self.stdout.write(f'Exported: {exported}')
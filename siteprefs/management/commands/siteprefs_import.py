@@ -0,0 +1,91 @@
+import json
+import sys
+from collections import OrderedDict
+from copy import copy
+
+from django.core.exceptions import ValidationError
+from django.core.management import BaseCommand, CommandError
+
+from ...toolbox import get_prefs, save_prefs
+
+
+class Command(BaseCommand):
+
+    help = (
+        'Imports preferences values from JSON lines: {"app": ..., "name": ..., "value": ...}. '
+        'Values are validated against preferences fields. Unknown and static preferences are skipped.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='File to read from. Use - for stdin.')
+        parser.add_argument('--app', action='append', dest='apps', help='Only import preferences of this app.')
+        parser.add_argument(
+            '--batch-size', type=int, default=500, help='Max number of entries to write in one query.')
+
+    def handle(self, *args, **options):
+        path = options['input']
+        apps = options['apps']
+
+        stream = sys.stdin if path == '-' else open(path)
+
+        try:
+            values, skipped = self.read_values(stream, apps)
+
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        changed = save_prefs(values, create=True, batch_size=options['batch_size'])
+
+        self.stdout.write(f'Changed: {len(changed)}. Skipped: {skipped}.')
+
+    def read_values(self, stream, apps):
+        """Reads and validates values from JSON lines stream.
+        Returns a tuple of values indexed by apps and names, and a number of skipped lines.
+
+        """
+        prefs = get_prefs()
+        fields = {}
+
+        values = OrderedDict()
+        skipped = 0
+
+        for line_no, line in enumerate(stream, 1):
+
+            line = line.strip()
+
+            if not line:
+                continue
+
+            try:
+                entry = json.loads(line)
+                app, pref_name, value = entry['app'], entry['name'], entry['value']
+
+            except (ValueError, TypeError, KeyError) as e:
+                raise CommandError(f'Line {line_no}: malformed entry: {e}')
+
+            if apps and app not in apps:
+                continue
+
+            proxy = prefs.get(app, {}).get(pref_name)
+
+            if proxy is None or proxy.static:
+                self.stderr.write(f'Line {line_no}: skipped unknown or static preference {app}.{pref_name}')
+                skipped += 1
+                continue
+
+            field = fields.get(id(proxy))
+
+            if field is None:
+                # Empty values are legit for preferences (and are exported as such).
+                field = fields[id(proxy)] = copy(proxy.field)
+                field.blank = field.null = True
+
+            try:
+                value = field.clean(value, None)
+
+            except ValidationError as e:
+                raise CommandError(f'Line {line_no}: invalid value for {app}.{pref_name}: {"; ".join(e.messages)}')
+
+            values.setdefault(app, OrderedDict())[pref_name] = value
+
+        return values, skipped
@@ -0,0 +1,16 @@
+from django.core.management import BaseCommand
+
+from ...models import PreferenceChange
+
+
+class Command(BaseCommand):
+
+    help = 'Deletes preferences changes log entries of all generations but the latest ones.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep', type=int, default=1000, help='Number of the latest generations to keep changes of.')
+
+    def handle(self, *args, **options):
+        deleted = PreferenceChange.prune(keep=options['keep'])
+        self.stdout.write(f'Deleted: {deleted}')
@@ -0,0 +1,137 @@
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Callable, Optional, Dict, Any, Type
+
+from django.db import connections, router
+from django.db.models import Model
+
+from .utils import PrefProxy
+
+MetricsCallback = Callable[[str, Dict[str, Any]], None]
+
+__CALLBACK: Optional[MetricsCallback] = None
+__EVENTS = defaultdict(Counter)
+
+
+def set_metrics_callback(callback: Optional[MetricsCallback]):
+    """Sets a function to be called on every recorded event.
+
+    The function receives event name and event data dictionary, e.g.:
+
+    .. code-block:: python
+
+        def export_metrics(event: str, data: dict):
+            statsd.timing(f'siteprefs.{event}', data['duration'])
+
+    :param callback: Function or None to unset.
+
+    """
+    global __CALLBACK
+    __CALLBACK = callback
+
+
+def enable_reads_counting(enable: bool = True):
+    """Toggles counting of ``PrefProxy.value`` reads per preference.
+
+    :param enable:
+
+    """
+    if enable:
+        if PrefProxy.reads is None:
+            PrefProxy.reads = Counter()
+
+    else:
+        PrefProxy.reads = None
+
+
+def record(event: str, **data: Any):
+    """Records an event.
+
+    Numeric event data values are summed up to be available through ``get_metrics()``.
+
+    :param event: Event name, e.g. read_prefs, update_prefs, refresh.
+
+    :param data: Event data, e.g. duration, rows, queries.
+
+    """
+    counters = __EVENTS[event]
+    counters['count'] += 1
+
+    for key, value in data.items():
+        if isinstance(value, (int, float)):
+            counters[key] += value
+
+    callback = __CALLBACK
+
+    if callback is not None:
+        callback(event, data)
+
+
+@contextmanager
+def measure(event: str, model: Type[Model] = None):
+    """Context manager to record an event with its duration.
+
+    Yields a dictionary to put additional event data into.
+
+    :param event: Event name.
+
+    :param model: If set, number of queries issued against the model's
+        write database is recorded as ``queries``.
+
+    """
+    data = {}
+    queries = []
+
+    def count_query(execute, *args):
+        queries.append(1)
+        return execute(*args)
+
+    started = perf_counter()
+
+    if model is None:
+        yield data
+
+    else:
+        with connections[router.db_for_write(model)].execute_wrapper(count_query):
+            yield data
+
+        data['queries'] = len(queries)
+
+    data['duration'] = perf_counter() - started
+
+    record(event, **data)
+
+
+def get_metrics() -> Dict[str, Any]:
+    """Returns a snapshot of metrics gathered so far:
+
+    * events - event names mapped into summed data (count, duration, rows, queries, etc.)
+    * reads - ``app.name`` preferences identifiers mapped into numbers of value reads
+      (see ``enable_reads_counting()``)
+
+    """
+    from .toolbox import get_prefs
+
+    reads = {}
+    counter = PrefProxy.reads
+
+    if counter:
+        for app, prefs in get_prefs().items():
+            for pref_name, pref_proxy in prefs.items():
+                count = counter.get(id(pref_proxy))
+                if count:
+                    reads[f'{app}.{pref_name}'] = count
+
+    return {
+        'events': {event: dict(counters) for event, counters in __EVENTS.items()},
+        'reads': reads,
+    }
+
+
+def reset_metrics():
+    """Resets metrics gathered so far."""
+    __EVENTS.clear()
+
+    if PrefProxy.reads is not None:
+        PrefProxy.reads = Counter()
@@ -0,0 +1,74 @@
+from asyncio import iscoroutinefunction
+
+from django.utils.decorators import sync_and_async_middleware
+
+from .toolbox import refresh_prefs, arefresh_prefs, get_prefs_snapshot, pin_prefs_snapshot, unpin_prefs_snapshot
+
+
+class PrefsRefreshMiddleware:
+    """Rereads preferences at the beginning of a request
+    if they were changed by another process.
+
+    .. code-block:: python
+
+        MIDDLEWARE = [
+            ...
+            'siteprefs.middleware.PrefsRefreshMiddleware',
+        ]
+
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        refresh_prefs()
+        return self.get_response(request)
+
+
+@sync_and_async_middleware
+def prefs_snapshot_middleware(get_response):
+    """Pins an immutable snapshot of preferences values for the whole request,
+    so that all reads within a request are consistent.
+
+    Preferences are checked for changes made by other processes once per request.
+
+    Snapshot is available as ``request.siteprefs`` and through
+    ``siteprefs.toolbox.get_request_prefs()``.
+
+    .. code-block:: python
+
+        MIDDLEWARE = [
+            ...
+            'siteprefs.middleware.prefs_snapshot_middleware',
+        ]
+
+    """
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            await arefresh_prefs()
+
+            snapshot = request.siteprefs = get_prefs_snapshot()
+            token = pin_prefs_snapshot(snapshot)
+
+            try:
+                return await get_response(request)
+
+            finally:
+                unpin_prefs_snapshot(token)
+
+    else:
+
+        def middleware(request):
+            refresh_prefs()
+
+            snapshot = request.siteprefs = get_prefs_snapshot()
+            token = pin_prefs_snapshot(snapshot)
+
+            try:
+                return get_response(request)
+
+            finally:
+                unpin_prefs_snapshot(token)
+
+    return middleware
@@ -0,0 +1,22 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('siteprefs', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Generation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.BigIntegerField(default=0, verbose_name='Value')),
+            ],
+            options={
+                'verbose_name': 'Generation',
+                'verbose_name_plural': 'Generations',
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('siteprefs', '0002_generation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='preference',
+            name='data',
+            field=models.JSONField(
+                blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True,
+                verbose_name='Typed value'),
+        ),
+    ]
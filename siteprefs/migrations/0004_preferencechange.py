@@ -0,0 +1,30 @@
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('siteprefs', '0003_preference_data'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PreferenceChange',
+            fields=[
+                ('seq', models.BigAutoField(primary_key=True, serialize=False, verbose_name='Sequence number')),
+                ('generation', models.BigIntegerField(db_index=True, verbose_name='Generation')),
+                ('app', models.CharField(blank=True, max_length=100, null=True, verbose_name='Application')),
+                ('name', models.CharField(max_length=150, verbose_name='Name')),
+                ('text', models.TextField(blank=True, null=True, verbose_name='Value')),
+                ('data', models.JSONField(
+                    blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True,
+                    verbose_name='Typed value')),
+                ('time', models.DateTimeField(auto_now_add=True, verbose_name='Date')),
+            ],
+            options={
+                'verbose_name': 'Preference change',
+                'verbose_name_plural': 'Preferences changes',
+            },
+        ),
+    ]
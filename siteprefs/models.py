@@ -1,13 +1,52 @@
-from django.db import models
+import json
+from datetime import datetime, time
+from typing import List, Iterable, Any, Dict, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.db.models import F
 from django.db.utils import IntegrityError
 from django.utils.translation import gettext_lazy as _
 
+from .utils import PrefProxy, publish_values, get_dynamic_prefs
+
+ASYNC_ORM = hasattr(models.QuerySet, 'afirst')
+"""Django async ORM is available (Django 4.1+). If not, sync queries are run in a thread."""
+
+
+class _TypedValueEncoder(DjangoJSONEncoder):
+    """Rejects datetimes and times, which DjangoJSONEncoder truncates to milliseconds."""
+
+    def default(self, o):
+        if isinstance(o, (datetime, time)):
+            raise TypeError('Loses precision')
+        return super().default(o)
+
+
+def get_typed_value(value: Any) -> Any:
+    """Returns a value to be stored in a typed (JSON) column,
+    or None if the value is not JSON serializable without loss
+    (such values are read from text column).
+
+    :param value:
+
+    """
+    try:
+        json.dumps(value, cls=_TypedValueEncoder)
+
+    except (TypeError, ValueError):
+        return None
+
+    return value
+
 
 class Preference(models.Model):
 
     app = models.CharField(_('Application'), max_length=100, null=True, blank=True, db_index=True)
     name = models.CharField(_('Name'), max_length=150)
     text = models.TextField(_('Value'), null=True, blank=True)
+    data = models.JSONField(_('Typed value'), null=True, blank=True, encoder=DjangoJSONEncoder)
 
     class Meta:
         verbose_name = _('Preference')
@@ -17,33 +56,40 @@ class Preference(models.Model):
     def __str__(self):
         return f'{self.app}:{self.name}'
 
+    @property
+    def value(self) -> Any:
+        """Stored value. Typed value is preferred if available."""
+        data = self.data
+        return self.text if data is None else data
+
     @classmethod
-    def read_prefs(cls, mem_prefs: dict):
+    def read_prefs(cls, mem_prefs: dict) -> int:
         """Initializes preferences entries in DB according to currently discovered prefs.
 
+        Only rows of apps having dynamic (non-static) preferences are read.
+        Returns the number of rows read.
+
         :param mem_prefs:
 
         """
-        db_prefs = {
-            f"{pref['app']}__{pref['name']}": pref for pref in
-            cls.objects.values().order_by('app', 'name')
-        }
+        missing = get_dynamic_prefs(mem_prefs)  # Do not add static options to DB.
 
-        new_prefs = []
+        if not missing:
+            return 0
 
-        for app, prefs in mem_prefs.items():
+        rows = 0
+        updates = []
 
-            for pref_name, pref_proxy in prefs.items():
+        for row in cls._get_rows(missing).iterator():
+            update = cls._get_row_update(missing, *row)
+            rows += 1
 
-                if not pref_proxy.static:  # Do not add static options to DB.
-                    key = f'{app}__{pref_name}'
+            if update is not None:
+                updates.append(update)
 
-                    if key in db_prefs:
-                        # Entry already exists in DB. Let's get pref value from there.
-                        pref_proxy.db_value = db_prefs[key]['text']
+        publish_values(updates)
 
-                    else:
-                        new_prefs.append(cls(app=app, name=pref_name, text=pref_proxy.default))
+        new_prefs = cls._get_new_prefs(missing)
 
         if new_prefs:
             try:
@@ -52,14 +98,431 @@ class Preference(models.Model):
             except IntegrityError:  # Don't bother with duplicates.
                 pass
 
+        return rows
+
+    @classmethod
+    async def aread_prefs(cls, mem_prefs: dict) -> int:
+        """Asynchronous version of ``read_prefs()``.
+
+        :param mem_prefs:
+
+        """
+        if not ASYNC_ORM:
+            return await sync_to_async(cls.read_prefs)(mem_prefs)
+
+        missing = get_dynamic_prefs(mem_prefs)  # Do not add static options to DB.
+
+        if not missing:
+            return 0
+
+        rows = 0
+        updates = []
+
+        async for row in cls._get_rows(missing):
+            update = cls._get_row_update(missing, *row)
+            rows += 1
+
+            if update is not None:
+                updates.append(update)
+
+        publish_values(updates)
+
+        new_prefs = cls._get_new_prefs(missing)
+
+        if new_prefs:
+            try:
+                await cls.objects.abulk_create(new_prefs)
+
+            except IntegrityError:  # Don't bother with duplicates.
+                pass
+
+        return rows
+
+    @classmethod
+    def read_app_prefs(cls, app: str, app_prefs: dict, names: Iterable[str] = None) -> int:
+        """Rereads from DB values of preferences of a certain app.
+        Returns the number of rows read.
+
+        :param app: Application name.
+
+        :param app_prefs: Application preferences dictionary.
+
+        :param names: Reread only preferences with the given names.
+
+        """
+        proxies = cls._get_app_proxies(app_prefs, names)
+
+        if not proxies:
+            return 0
+
+        updates = []
+
+        for pref_name, text, data in cls._get_app_rows(app, proxies):
+            updates.append((proxies[pref_name], text if data is None else data))
+
+        publish_values(updates)
+
+        return len(updates)
+
+    @classmethod
+    async def aread_app_prefs(cls, app: str, app_prefs: dict, names: Iterable[str] = None) -> int:
+        """Asynchronous version of ``read_app_prefs()``.
+
+        :param app: Application name.
+
+        :param app_prefs: Application preferences dictionary.
+
+        :param names: Reread only preferences with the given names.
+
+        """
+        if not ASYNC_ORM:
+            return await sync_to_async(cls.read_app_prefs)(app, app_prefs, names=names)
+
+        proxies = cls._get_app_proxies(app_prefs, names)
+
+        if not proxies:
+            return 0
+
+        updates = []
+
+        async for pref_name, text, data in cls._get_app_rows(app, proxies):
+            updates.append((proxies[pref_name], text if data is None else data))
+
+        publish_values(updates)
+
+        return len(updates)
+
+    @classmethod
+    def _get_rows(cls, dynamic: Dict[str, dict]) -> models.QuerySet:
+        return cls.objects.filter(app__in=list(dynamic)).order_by().values_list('app', 'name', 'text', 'data')
+
+    @classmethod
+    def _get_row_update(
+            cls,
+            missing: Dict[str, dict],
+            app: str,
+            pref_name: str,
+            text: Optional[str],
+            data: Any
+    ) -> Optional[Tuple[PrefProxy, Any]]:
+        pref_proxy = missing[app].pop(pref_name, None)
+
+        if pref_proxy is None:
+            return None
+
+        # Entry already exists in DB. Let's get pref value from there.
+        return pref_proxy, text if data is None else data
+
+    @classmethod
+    def _get_new_prefs(cls, missing: Dict[str, dict]) -> List['Preference']:
+        return [
+            cls(app=app, name=pref_name, text=pref_proxy.default, data=get_typed_value(pref_proxy.default))
+            for app, prefs in missing.items()
+            for pref_name, pref_proxy in prefs.items()
+        ]
+
+    @classmethod
+    def _get_app_proxies(cls, app_prefs: dict, names: Optional[Iterable[str]]) -> dict:
+        proxies = {
+            pref_name: pref_proxy for pref_name, pref_proxy in app_prefs.items()
+            if not pref_proxy.static
+        }
+
+        if names is not None:
+            proxies = {pref_name: proxies[pref_name] for pref_name in names if pref_name in proxies}
+
+        return proxies
+
+    @classmethod
+    def _get_app_rows(cls, app: str, proxies: dict) -> models.QuerySet:
+        return cls.objects.filter(app=app, name__in=list(proxies)).values_list('name', 'text', 'data')
+
+    @classmethod
+    def update_prefs(cls, *args, **kwargs) -> List[str]:
+        """Saves updated preferences values into DB.
+
+        Only values differing from those in DB are written
+        using one batch update. Returns names of changed preferences.
+
+        """
+        return [pref_name for _, pref_name in cls.write_prefs({kwargs['app']: kwargs['updated_prefs']})]
+
+    @classmethod
+    def write_prefs(
+            cls,
+            prefs: Dict[str, Dict[str, Any]],
+            create: bool = False,
+            batch_size: int = None
+    ) -> List[Tuple[str, str]]:
+        """Saves preferences values into DB.
+
+        Only values differing from those in DB are written,
+        using batch queries inside one transaction.
+        Returns (app, name) pairs of changed preferences.
+
+        :param prefs: Values indexed by application names and preferences names.
+
+        :param create: Create entries missing in DB.
+
+        :param batch_size: Max number of entries to write in one query.
+
+        """
+        to_text = cls._meta.get_field('text').to_python
+
+        changed = []
+        created = []
+
+        with transaction.atomic():
+
+            for app, values in prefs.items():
+
+                existing = set()
+                db_prefs = cls.objects.filter(app=app, name__in=list(values)).only('app', 'name', 'text', 'data')
+
+                for db_pref in db_prefs:
+
+                    existing.add(db_pref.name)
+
+                    value = values[db_pref.name]
+                    text = to_text(value)
+                    data = get_typed_value(value)
+
+                    # Also fill typed value for entries saved before it was introduced.
+                    if db_pref.text != text or (db_pref.data is None) != (data is None):
+                        db_pref.text = text
+                        db_pref.data = data
+                        changed.append(db_pref)
+
+                if create:
+                    created.extend(
+                        cls(app=app, name=pref_name, text=to_text(value), data=get_typed_value(value))
+                        for pref_name, value in values.items()
+                        if pref_name not in existing
+                    )
+
+            if changed:
+                cls.objects.bulk_update(changed, ['text', 'data'], batch_size=batch_size)
+
+            if created:
+                cls.objects.bulk_create(created, batch_size=batch_size)
+
+            written = changed + created
+
+            if written:
+                # Generation row stays locked until commit, so that
+                # concurrent writers log their changes one after another.
+                Generation.bump()
+                PreferenceChange.log(written, Generation.get_value(), batch_size=batch_size)
+
+        return [(db_pref.app, db_pref.name) for db_pref in written]
+
     @classmethod
-    def update_prefs(cls, *args, **kwargs):
-        # TODO That could be more efficient.
+    async def aupdate_prefs(cls, *args, **kwargs) -> List[str]:
+        """Asynchronous version of ``update_prefs()``."""
+        # Transactions are not supported in async context.
+        return await sync_to_async(cls.update_prefs)(*args, **kwargs)
+
+
+class Generation(models.Model):
+    """Preferences generation counter.
+
+    Bumped on every preferences save, so that every process
+    could cheaply check whether preferences need to be reread.
+
+    """
+    ROW_ID = 1
 
-        updated_prefs = kwargs['updated_prefs']
+    value = models.BigIntegerField(_('Value'), default=0)
 
-        for db_pref in cls.objects.filter(app=kwargs['app']):
+    class Meta:
+        verbose_name = _('Generation')
+        verbose_name_plural = _('Generations')
+
+    def __str__(self):
+        return f'{self.value}'
+
+    @classmethod
+    def get_value(cls) -> int:
+        """Returns current preferences generation number."""
+        value = cls.objects.filter(pk=cls.ROW_ID).values_list('value', flat=True).first()
+        return value or 0
+
+    @classmethod
+    async def aget_value(cls) -> int:
+        """Asynchronous version of ``get_value()``."""
+        if not ASYNC_ORM:
+            return await sync_to_async(cls.get_value)()
+
+        value = await cls.objects.filter(pk=cls.ROW_ID).values_list('value', flat=True).afirst()
+        return value or 0
+
+    @classmethod
+    def bump(cls):
+        """Increments preferences generation number."""
+        if cls.objects.filter(pk=cls.ROW_ID).update(value=F('value') + 1):
+            return
+
+        try:
+            with transaction.atomic():
+                cls.objects.create(pk=cls.ROW_ID, value=1)
+
+        except IntegrityError:  # Created concurrently.
+            cls.objects.filter(pk=cls.ROW_ID).update(value=F('value') + 1)
+
+    @classmethod
+    async def abump(cls):
+        """Asynchronous version of ``bump()``."""
+        await sync_to_async(cls.bump)()
+
+
+class PreferenceChange(models.Model):
+    """Append-only log of preferences values changes.
+
+    Every changed value is logged under preferences generation
+    it was saved with, so that processes could apply only changes
+    made since the generation they've seen instead of rereading all preferences.
+
+    """
+    seq = models.BigAutoField(_('Sequence number'), primary_key=True)
+    generation = models.BigIntegerField(_('Generation'), db_index=True)
+    app = models.CharField(_('Application'), max_length=100, null=True, blank=True)
+    name = models.CharField(_('Name'), max_length=150)
+    text = models.TextField(_('Value'), null=True, blank=True)
+    data = models.JSONField(_('Typed value'), null=True, blank=True, encoder=DjangoJSONEncoder)
+    time = models.DateTimeField(_('Date'), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _('Preference change')
+        verbose_name_plural = _('Preferences changes')
+
+    def __str__(self):
+        return f'{self.seq}: {self.app}.{self.name}'
+
+    @property
+    def value(self) -> Any:
+        """Returns changed value."""
+        data = self.data
+        return self.text if data is None else data
+
+    @classmethod
+    def log(cls, prefs: Iterable[Preference], generation: int, batch_size: int = None):
+        """Logs values of the given preferences.
 
-            if db_pref.name in updated_prefs:
-                db_pref.text = updated_prefs[db_pref.name]
-                db_pref.save()
+        :param prefs: Preferences entries.
+
+        :param generation: Preferences generation number the values are saved with.
+
+        :param batch_size: Max number of entries to write in one query.
+
+        """
+        cls.objects.bulk_create(
+            [
+                cls(generation=generation, app=pref.app, name=pref.name, text=pref.text, data=pref.data)
+                for pref in prefs
+            ],
+            batch_size=batch_size
+        )
+
+    @classmethod
+    def get_changes(
+            cls,
+            since: int = 0,
+            since_generation: int = None,
+            until_generation: int = None
+    ) -> models.QuerySet:
+        """Returns changes logged after the given sequence number ordered by sequence numbers.
+
+        :param since: Sequence number to return changes after.
+
+        :param since_generation: Return only changes of generations greater than this one.
+
+        :param until_generation: Return only changes of generations not greater than this one.
+
+        """
+        changes = cls.objects.filter(seq__gt=since)
+
+        if since_generation is not None:
+            changes = changes.filter(generation__gt=since_generation)
+
+        if until_generation is not None:
+            changes = changes.filter(generation__lte=until_generation)
+
+        return changes.order_by('seq')
+
+    @classmethod
+    def read_changes(cls, mem_prefs: dict, since_generation: int, generation: int) -> Optional[int]:
+        """Applies to preferences changes logged after the given generation up to another one.
+        Returns the number of changes read or None if the log doesn't cover
+        all those generations and thus all preferences are to be reread.
+
+        :param mem_prefs: Preferences dictionary indexed by application names and preferences names.
+
+        :param since_generation: Generation seen last.
+
+        :param generation: Current generation.
+
+        """
+        return cls._apply_changes(
+            mem_prefs, list(cls._get_changes_rows(since_generation, generation)), since_generation, generation)
+
+    @classmethod
+    async def aread_changes(cls, mem_prefs: dict, since_generation: int, generation: int) -> Optional[int]:
+        """Asynchronous version of ``read_changes()``.
+
+        :param mem_prefs: Preferences dictionary indexed by application names and preferences names.
+
+        :param since_generation: Generation seen last.
+
+        :param generation: Current generation.
+
+        """
+        if not ASYNC_ORM:
+            return await sync_to_async(cls.read_changes)(mem_prefs, since_generation, generation)
+
+        rows = [row async for row in cls._get_changes_rows(since_generation, generation)]
+        return cls._apply_changes(mem_prefs, rows, since_generation, generation)
+
+    @classmethod
+    def _get_changes_rows(cls, since_generation: int, generation: int) -> models.QuerySet:
+        return cls.get_changes(
+            since_generation=since_generation,
+            until_generation=generation,
+        ).values_list('generation', 'app', 'name', 'text', 'data')
+
+    @classmethod
+    def _apply_changes(
+            cls,
+            mem_prefs: dict,
+            rows: List[tuple],
+            since_generation: int,
+            generation: int
+    ) -> Optional[int]:
+        # Every generation might have been pruned from the log
+        # or bumped without logging (e.g. by an older siteprefs version).
+        if len({row[0] for row in rows}) != generation - since_generation:
+            return None
+
+        updates = []
+
+        for __, app, pref_name, text, data in rows:
+            pref_proxy = mem_prefs.get(app, {}).get(pref_name)
+
+            if pref_proxy is not None and not pref_proxy.static:
+                updates.append((pref_proxy, text if data is None else data))
+
+        publish_values(updates)
+
+        return len(rows)
+
+    @classmethod
+    def prune(cls, keep: int = 1000) -> int:
+        """Deletes changes of all generations but the latest ones.
+        Returns the number of deleted entries.
+
+        Processes which have seen a pruned generation will reread all preferences.
+
+        :param keep: Number of the latest generations to keep changes of.
+
+        """
+        deleted, __ = cls.objects.filter(generation__lte=Generation.get_value() - keep).delete()
+        return deleted
@@ -0,0 +1,148 @@
+import logging
+import os
+from random import uniform
+from threading import Thread, Event, Lock
+from typing import Optional
+
+from django.core.signals import request_started
+from django.db import close_old_connections
+
+from .settings import REFRESH_INTERVAL, REFRESH_JITTER
+from .toolbox import refresh_prefs
+from .utils import PrefProxy
+
+__REFRESHER: Optional['PrefsRefresher'] = None
+__FORK_HOOKED = False
+__START_LOCK = Lock()
+
+LOGGER = logging.getLogger(__name__)
+
+
+class PrefsRefresher(Thread):
+    """Daemon thread periodically rereading preferences
+    if they were changed by another process (see ``refresh_prefs()``).
+
+    """
+    def __init__(self, interval: float, jitter: float = 0):
+        """
+
+        :param interval: Seconds between checks.
+
+        :param jitter: Fraction of interval to randomly add to or subtract from it,
+            so that processes started together do not poll in lockstep.
+
+        """
+        super().__init__(name='siteprefs-refresher', daemon=True)
+        self.interval = interval
+        self.jitter = jitter
+        self.stopped = Event()
+
+    def get_delay(self) -> float:
+        """Returns seconds to wait before the next check."""
+        jitter = self.jitter
+        return self.interval * (1 + uniform(-jitter, jitter))
+
+    def run(self):
+
+        while not self.stopped.wait(self.get_delay()):
+
+            if PrefProxy.deferred_load is not None:
+                # Nothing is loaded yet (lazy mode), first access will read everything.
+                continue
+
+            try:
+                refresh_prefs()
+
+            except Exception:
+                LOGGER.exception('Unable to refresh preferences.')
+
+            finally:
+                close_old_connections()
+
+    def stop(self):
+        """Signals the thread to stop."""
+        self.stopped.set()
+
+
+def start_refresher(interval: float = None, jitter: float = None) -> PrefsRefresher:
+    """Starts background preferences refresher thread replacing the one already started.
+
+    The thread is restarted in forked child processes.
+
+    :param interval: Seconds between checks. If not set SITEPREFS_REFRESH_INTERVAL is used.
+
+    :param jitter: Fraction of interval to randomly add to or subtract from it.
+        If not set SITEPREFS_REFRESH_JITTER is used.
+
+    """
+    global __REFRESHER, __FORK_HOOKED
+
+    if interval is None:
+        interval = REFRESH_INTERVAL
+
+    if jitter is None:
+        jitter = REFRESH_JITTER
+
+    stop_refresher()
+
+    refresher = PrefsRefresher(interval, jitter)
+    refresher.start()
+
+    __REFRESHER = refresher
+
+    if not __FORK_HOOKED and hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_on_fork)
+        __FORK_HOOKED = True
+
+    return refresher
+
+
+def start_refresher_on_request():
+    """Defers background preferences refresher thread start
+    until the first request served by the process,
+    so that management commands and other processes not serving
+    requests do not poll DB.
+
+    """
+    request_started.connect(_on_request_started, dispatch_uid=__name__)
+
+
+def _on_request_started(**kwargs):
+
+    with __START_LOCK:
+
+        if request_started.disconnect(dispatch_uid=__name__):
+            start_refresher()
+
+
+def stop_refresher(timeout: float = None):
+    """Stops background preferences refresher thread if started.
+
+    :param timeout: Seconds to wait for the thread to finish.
+        If not set, the thread is not waited for.
+
+    """
+    global __REFRESHER
+
+    refresher = __REFRESHER
+
+    if refresher is None:
+        return
+
+    __REFRESHER = None
+
+    refresher.stop()
+
+    if timeout is not None:
+        refresher.join(timeout)
+
+
+def _on_fork():
+    global __REFRESHER
+
+    # Threads do not survive fork.
+    refresher = __REFRESHER
+
+    if refresher is not None:
+        __REFRESHER = None
+        start_refresher(refresher.interval, refresher.jitter)
@@ -9,3 +9,30 @@ DISABLE_AUTODISCOVER = getattr(settings, 'SITEPREFS_DISABLE_AUTODISCOVER', False
 
 PREFS_MODULE_NAME = getattr(settings, 'SITEPREFS_MODULE_NAME', 'settings')
 """Module name used by siteprefs.toolbox.autodiscover_siteprefs() to find preferences in application packages."""
+
+LAZY_LOAD = getattr(settings, 'SITEPREFS_LAZY_LOAD', False)
+"""Defers reading preferences from DB until the first dynamic preference value access."""
+
+LAZY_ADMIN = getattr(settings, 'SITEPREFS_LAZY_ADMIN', False)
+"""Defers creation and registration of preferences models for Admin until URLconf is loaded."""
+
+METRICS_CALLBACK = getattr(settings, 'SITEPREFS_METRICS_CALLBACK', None)
+"""Dotted path to a function called on every instrumentation event (see siteprefs.metrics)."""
+
+COUNT_READS = getattr(settings, 'SITEPREFS_COUNT_READS', False)
+"""Enables counting of preferences values reads."""
+
+SHARED_SNAPSHOT = getattr(settings, 'SITEPREFS_SHARED_SNAPSHOT', None)
+"""Path to a file to share preferences values snapshot between processes on the same host."""
+
+REFRESH_INTERVAL = getattr(settings, 'SITEPREFS_REFRESH_INTERVAL', None)
+"""Seconds between preferences changes checks done by a background thread."""
+
+REFRESH_JITTER = getattr(settings, 'SITEPREFS_REFRESH_JITTER', 0.1)
+"""Fraction of SITEPREFS_REFRESH_INTERVAL to randomly add to or subtract from it."""
+
+BACKEND = getattr(settings, 'SITEPREFS_BACKEND', 'siteprefs.backends.db.DatabaseBackend')
+"""Dotted path to preferences values storage backend class (see siteprefs.backends)."""
+
+BACKEND_OPTIONS = getattr(settings, 'SITEPREFS_BACKEND_OPTIONS', {})
+"""Keyword arguments to initialize preferences values storage backend with."""
@@ -0,0 +1,124 @@
+import json
+import os
+import struct
+from mmap import mmap, ACCESS_READ
+from tempfile import mkstemp
+from typing import Optional, Tuple, Dict, Any
+
+from .utils import PreciseJSONEncoder
+
+SnapshotValues = Dict[str, Dict[str, Any]]
+
+
+class SharedSnapshot:
+    """Preferences values snapshot stored in a memory-mapped file
+    shared by processes on the same host.
+
+    File layout: generation (8 bytes), payload length (8 bytes), JSON payload.
+
+    A new snapshot is written into a temporary file which then atomically
+    replaces the previous one, so readers never see a partially written snapshot.
+
+    """
+    header = struct.Struct('<QQ')
+
+    def __init__(self, path: str):
+        self.path = path
+        self._mmap: Optional[mmap] = None
+        self._inode: Optional[int] = None
+
+    def close(self):
+        """Unmaps the file."""
+        mapped = self._mmap
+
+        if mapped is not None:
+            mapped.close()
+
+        self._mmap = None
+        self._inode = None
+
+    def _get_mapped(self) -> Optional[mmap]:
+        try:
+            inode = os.stat(self.path).st_ino
+
+        except FileNotFoundError:
+            self.close()
+            return None
+
+        if inode != self._inode:
+            # The file has been replaced by a writer. Remap.
+            self.close()
+
+            with open(self.path, 'rb') as f:
+                if not os.fstat(f.fileno()).st_size:
+                    return None
+
+                self._mmap = mmap(f.fileno(), 0, access=ACCESS_READ)
+
+            self._inode = inode
+
+        return self._mmap
+
+    def get_generation(self) -> Optional[int]:
+        """Returns preferences generation number of the snapshot
+        or None if there is no snapshot.
+
+        """
+        mapped = self._get_mapped()
+
+        if mapped is None or len(mapped) < self.header.size:
+            return None
+
+        return self.header.unpack_from(mapped)[0]
+
+    def read(self) -> Optional[Tuple[int, SnapshotValues]]:
+        """Returns a tuple of preferences generation number and values
+        indexed by application names and preferences names, or None if there is no snapshot.
+
+        """
+        mapped = self._get_mapped()
+
+        if mapped is None or len(mapped) < self.header.size:
+            return None
+
+        generation, length = self.header.unpack_from(mapped)
+        offset = self.header.size
+
+        try:
+            return generation, json.loads(mapped[offset:offset + length])
+
+        except ValueError:  # Damaged or not fully written file.
+            return None
+
+    def write(self, generation: int, values: SnapshotValues) -> bool:
+        """Writes a snapshot. Returns False if a snapshot of a newer generation is already written.
+
+        :param generation: Preferences generation number.
+
+        :param values: Values indexed by application names and preferences names.
+
+        """
+        generation_current = self.get_generation()
+
+        if generation_current is not None and generation_current > generation:
+            return False
+
+        payload = json.dumps(values, cls=PreciseJSONEncoder).encode()
+
+        # Unique temporary file, so that concurrent writers (e.g. threads) never share it.
+        fd, path_tmp = mkstemp(dir=os.path.dirname(self.path) or None, suffix='.tmp')
+
+        try:
+            os.fchmod(fd, 0o644)
+
+            with os.fdopen(fd, 'wb') as f:
+                f.write(self.header.pack(generation, len(payload)))
+                f.write(payload)
+
+            os.replace(path_tmp, self.path)
+
+        except BaseException:
+            os.unlink(path_tmp)
+            raise
+
+        return True
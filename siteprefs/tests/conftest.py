@@ -1,6 +1,37 @@
+import pytest
 from pytest_djangoapp import configure_djangoapp_plugin
 
 pytest_plugins = configure_djangoapp_plugin({
     'SITEPREFS_EXPOSE_MODEL_TO_ADMIN': True,
     'SITEPREFS_DISABLE_AUTODISCOVER': True,
 }, admin_contrib=True)
+
+
+@pytest.fixture(autouse=True)
+def prefs_registry():
+    """Removes applications registered during a test from preferences registry."""
+    from siteprefs.toolbox import get_prefs
+
+    registry = get_prefs()
+    apps_before = set(registry)
+
+    yield registry
+
+    for app in set(registry) - apps_before:
+        del registry[app]
+
+
+@pytest.fixture
+def testapp_prefs(prefs_registry):
+    """Registers preferences of the test application."""
+    from siteprefs.tests.testapp import settings  # Registers preferences on the first import.
+    from siteprefs.toolbox import register_proxy
+    from siteprefs.utils import PrefProxy
+
+    if 'testapp' not in prefs_registry:
+        # Registered on import by a previous test.
+        for value in vars(settings._module).values():
+            if isinstance(value, PrefProxy):
+                register_proxy('testapp', value)
+
+    return prefs_registry['testapp']
@@ -0,0 +1,165 @@
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.test import TestCase
+
+from siteprefs.backends import get_backend, set_backend
+from siteprefs.backends.cache import CacheBackend
+from siteprefs.backends.cached_db import CachedDatabaseBackend
+from siteprefs.backends.db import DatabaseBackend
+from siteprefs.backends.file import FileBackend
+from siteprefs.models import Generation, Preference
+from siteprefs.toolbox import register_proxy, get_app_prefs, get_prefs, refresh_prefs, save_prefs, asave_app_prefs, \
+    save_app_prefs
+from siteprefs.utils import PrefProxy
+
+
+@pytest.fixture
+def backend_prefs():
+    register_proxy('backendapp', PrefProxy('NUMBER', 1, static=False))
+    register_proxy('backendapp', PrefProxy('TITLE', 'one', static=False))
+    register_proxy('backendapp', PrefProxy('STATIC', 'yes'))
+    register_proxy('backendother', PrefProxy('OTHER', True, static=False))
+
+    yield get_app_prefs('backendapp')
+
+    del get_prefs()['backendapp']
+    del get_prefs()['backendother']
+
+
+@pytest.fixture(params=['cache', 'file'])
+def backend(request, tmp_path):
+
+    if request.param == 'cache':
+        backend = CacheBackend(prefix=f'siteprefs-{tmp_path.name}')
+
+    else:
+        backend = FileBackend(str(tmp_path / 'siteprefs.json'))
+
+    set_backend(backend)
+
+    yield backend
+
+    set_backend(None)
+    refresh_prefs(force=True)
+
+
+@pytest.fixture
+def cached_backend(tmp_path):
+    backend = CachedDatabaseBackend(prefix=f'siteprefs-{tmp_path.name}')
+
+    set_backend(backend)
+
+    yield backend
+
+    set_backend(None)
+    refresh_prefs(force=True)
+
+
+def test_default():
+    assert isinstance(get_backend(), DatabaseBackend)
+
+
+def test_backend(backend, backend_prefs):
+    assert backend.get_version() == 0
+
+    # Entries are initialized with defaults.
+    assert refresh_prefs(force=True)
+    assert list(backend.dump(['backendapp'])) == [('backendapp', 'number', 1), ('backendapp', 'title', 'one')]
+    assert backend.get_version() == 0
+    assert 'backendapp' in backend.get_apps()
+
+    assert save_prefs({'backendapp': {'number': 5, 'title': 'one'}}) == [('backendapp', 'number')]
+    assert backend.get_version() == 1
+    assert backend_prefs['number'].value == 5
+    assert not refresh_prefs()
+
+    # Missing entries are created only if asked.
+    assert save_prefs({'backendapp': {'unknown': 1}}) == []
+    assert save_prefs({'backendapp': {'unknown': 1}}, create=True) == [('backendapp', 'unknown')]
+
+    # Changed by another process.
+    backend.set_apps_values({'backendapp': {'number': '7', 'title': 'other'}})
+    assert refresh_prefs()
+    assert backend_prefs['number'].value == 7
+    assert backend_prefs['title'].value == 'other'
+    assert not refresh_prefs()
+
+    assert async_to_sync(asave_app_prefs)('backendapp', {'title': 'async'}) == ['title']
+    assert backend_prefs['title'].value == 'async'
+    assert backend.get_apps_values(['backendapp', 'nosuchapp']) == {'backendapp': {'number': '7', 'title': 'async'}}
+
+
+def test_backend_typed(backend):
+    values = {'typedapp': {'stamp': datetime(2021, 12, 18, 10, 30, 15, 123456), 'amount': Decimal('1.50')}}
+
+    assert backend.write_prefs(values, create=True) == [('typedapp', 'stamp'), ('typedapp', 'amount')]
+    assert backend.get_version() == 1
+
+    # Stored values may be JSON decoded, but are still the same.
+    assert backend.write_prefs(values) == []
+    assert backend.get_version() == 1
+
+    values['typedapp']['stamp'] = values['typedapp']['stamp'].replace(microsecond=123457)
+    assert backend.write_prefs(values) == [('typedapp', 'stamp')]
+    assert backend.get_version() == 2
+
+
+def test_cached_db(cached_backend, backend_prefs, db_queries):
+    # Read through.
+    assert refresh_prefs(force=True)
+    generation = Generation.get_value()
+    assert cached_backend.get_cached(generation, ['backendapp']) == {'backendapp': {'number': 1, 'title': 'one'}}
+
+    with db_queries.scope() as queries:
+        assert refresh_prefs(force=True)
+        assert len(queries) == 1  # Generation only, values are from cache.
+
+    # Write through.
+    with TestCase.captureOnCommitCallbacks(execute=True):
+        assert save_prefs({'backendapp': {'number': 5}}) == [('backendapp', 'number')]
+
+    cached = cached_backend.get_cached(generation + 1, ['backendapp', 'backendother'])
+    assert cached == {'backendapp': {'number': 5, 'title': 'one'}, 'backendother': {'other': True}}
+
+    # Another process starts.
+    backend_prefs['number'].db_value = 0
+
+    with db_queries.scope() as queries:
+        assert refresh_prefs(force=True)
+        assert len(queries) == 1
+
+    assert backend_prefs['number'].value == 5
+
+
+def test_cached_db_new_pref(cached_backend, backend_prefs):
+    assert refresh_prefs(force=True)  # App is cached.
+
+    # Preference added in a new release.
+    register_proxy('backendapp', PrefProxy('ADDED', 'new', static=False))
+
+    assert refresh_prefs(force=True)
+    assert Preference.objects.filter(app='backendapp', name='added').exists()
+
+    assert save_app_prefs('backendapp', {'added': 'changed'}) == ['added']
+    assert Preference.objects.get(app='backendapp', name='added').text == 'changed'
+
+
+def test_file_damaged(tmp_path):
+    path = tmp_path / 'siteprefs.json'
+    backend = FileBackend(str(path))
+
+    backend.set_apps_values({'myapp': {'one': 1}})
+    backend.set_apps_values({'other': {'two': 2}})
+    assert backend.get_version() == 2
+    assert backend.get_apps_values(['myapp', 'other']) == {'myapp': {'one': 1}, 'other': {'two': 2}}
+    assert [item.name for item in tmp_path.iterdir()] == ['siteprefs.json']
+
+    path.write_text('{"version": 3, "val')
+    assert backend.get_version() == 0
+    assert backend.get_apps() == []
+
+    backend.set_apps_values({'myapp': {'one': 3}})
+    assert backend.get_apps_values(['myapp']) == {'myapp': {'one': 3}}
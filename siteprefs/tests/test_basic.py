@@ -1,14 +1,24 @@
+import os
+import sys
+import tracemalloc
+from datetime import datetime
+from types import ModuleType
+
 import pytest
+from asgiref.sync import async_to_sync
 from django.contrib import admin
+from django.contrib.admin import AdminSite
 from django.db import models
 
-from siteprefs.models import Preference
-from siteprefs.toolbox import autodiscover_siteprefs, get_app_prefs, get_prefs_models
+from siteprefs.models import Preference, Generation, PreferenceChange, get_typed_value
+from siteprefs.toolbox import autodiscover_siteprefs, get_app_prefs, get_prefs_models, refresh_prefs, \
+    ModuleProxy, bind_module_prefs, proxy_module, arefresh_prefs, asave_app_prefs, aget_app_values, \
+    get_prefs_snapshot, get_request_prefs, preload_prefs
 from siteprefs.utils import Frame, PatchedLocal, PrefProxy, get_field_for_proxy, get_pref_model_class, \
-    get_pref_model_admin_class, get_frame_locals, import_module, PREFS_MODULE_NAME
+    get_pref_model_admin_class, get_frame_locals, import_module, PREFS_MODULE_NAME, publish_values
 
 
-def test_many():
+def test_many(testapp_prefs):
     __package__ = 'siteprefs.tests.testapp'
 
     autodiscover_siteprefs()
@@ -37,6 +47,7 @@ def test_many():
 
     pref = list(Preference.objects.all())[0]
     assert pref.text == 'other_value'
+    assert pref.value == 'other_value'
     assert '%s' % pref == 'testapp:my_option_2'
 
     from siteprefs.tests.testapp import testmodule
@@ -47,6 +58,505 @@ def test_many():
     update_option_2(44)
 
     assert testmodule.read_option_2() == '44'
+    assert Preference.objects.get(name='my_option_2').data == 44
+
+    # Own save doesn't cause full reread.
+    assert not refresh_prefs()
+
+    # Nothing changed - nothing saved.
+    update_option_2(44)
+    assert not refresh_prefs()
+
+
+def test_refresh(testapp_prefs):
+    from siteprefs.tests.testapp import testmodule
+
+    assert refresh_prefs(force=True)
+    assert not refresh_prefs()
+
+    value_before = testmodule.read_option_2()
+
+    # Simulate a change made by another process.
+    Preference.objects.filter(app='testapp', name='my_option_2').update(text='changed', data='changed')
+    assert not refresh_prefs()
+    assert testmodule.read_option_2() == value_before
+
+    Generation.bump()
+    assert Generation.get_value() == 1
+
+    assert refresh_prefs()
+    assert testmodule.read_option_2() == 'changed'
+    assert not refresh_prefs()
+
+    Generation.bump()
+    assert Generation.get_value() == 2
+
+
+def test_read_prefs(db_queries):
+    p1 = PrefProxy('p1', 'a', static=False)
+    p2 = PrefProxy('p2', 'b', static=False)
+    p3 = PrefProxy('p3', 'c')
+
+    Preference.objects.bulk_create([
+        Preference(app='myapp', name='p1', text='x'),
+        Preference(app='gone', name='p1', text='gone'),
+    ])
+
+    db_queries.clear()
+    Preference.read_prefs({'myapp': {'p1': p1, 'p2': p2, 'p3': p3}, 'static': {'p3': p3}})
+
+    select = [sql for sql in db_queries.sql() if sql.startswith('SELECT')]
+    assert len(select) == 1
+    assert "IN ('myapp')" in select[0]
+    assert 'ORDER BY' not in select[0]
+
+    assert [p1.value, p2.value, p3.value] == ['x', 'b', 'c']
+    assert dict(Preference.objects.filter(app='myapp').values_list('name', 'text')) == {'p1': 'x', 'p2': 'b'}
+    assert not Preference.objects.filter(app='static').exists()
+
+
+def test_read_prefs_malformed():
+    prefs = {
+        'malformedapp': {
+            'number': PrefProxy('NUMBER', 5, static=False),
+            'title': PrefProxy('TITLE', 'default', static=False),
+        }
+    }
+    Preference.objects.bulk_create([
+        Preference(app='malformedapp', name='number', text='abc'),
+        Preference(app='malformedapp', name='title', text='valid'),
+    ])
+
+    assert Preference.read_prefs(prefs) == 2
+    assert prefs['malformedapp']['number'].value == 5  # Falls back to default.
+    assert prefs['malformedapp']['title'].value == 'valid'
+
+
+def test_typed_value():
+    assert get_typed_value(object()) is None
+    assert get_typed_value([1, 'a']) == [1, 'a']
+    assert get_typed_value(datetime(2021, 12, 18)) is None  # Read from text to keep precision.
+
+    stamp = datetime(2021, 12, 18, 10, 30, 15, 123456)
+
+    prefs = {'myapp': {
+        'flag': PrefProxy('flag', True, static=False),
+        'stamp': PrefProxy('stamp', stamp, static=False),
+    }}
+    Preference.read_prefs(prefs)
+    assert dict(Preference.objects.filter(app='myapp').values_list('name', 'data')) == {
+        'flag': True, 'stamp': None}
+
+    prefs = {'myapp': {
+        'flag': PrefProxy('flag', False, static=False),
+        'stamp': PrefProxy('stamp', datetime(2000, 1, 1), static=False),
+    }}
+    Preference.read_prefs(prefs)
+    assert prefs['myapp']['flag'].db_value is True
+    assert prefs['myapp']['flag'].value is True
+    assert prefs['myapp']['stamp'].value == stamp
+
+    # Values without typed representation are not considered changed when unchanged.
+    values = {'myapp': {'flag': True, 'stamp': stamp}}
+    assert Preference.write_prefs(values) == []
+
+    values['myapp']['stamp'] = stamp.replace(microsecond=123457)
+    assert Preference.write_prefs(values) == [('myapp', 'stamp')]
+
+
+def test_read_app_prefs():
+    p1 = PrefProxy('p1', 'a', static=False)
+    p2 = PrefProxy('p2', 'b', static=False)
+    p3 = PrefProxy('p3', 'c')
+
+    Preference.objects.bulk_create([
+        Preference(app='myapp', name='p1', text='x'),
+        Preference(app='myapp', name='p2', text='y'),
+        Preference(app='myapp', name='p3', text='z'),
+        Preference(app='other', name='p1', text='other'),
+    ])
+
+    app_prefs = {'p1': p1, 'p2': p2, 'p3': p3}
+
+    Preference.read_app_prefs('myapp', app_prefs, names=['p2', 'p3', 'unknown'])
+    assert [p1.value, p2.value, p3.value] == ['a', 'y', 'c']
+
+    Preference.read_app_prefs('myapp', app_prefs)
+    assert [p1.value, p2.value, p3.value] == ['x', 'y', 'c']
+
+
+def test_lazy_load(testapp_prefs, db_queries):
+
+    with db_queries.scope() as queries:
+        __package__ = 'siteprefs.tests.testapp'
+        autodiscover_siteprefs(admin_site=AdminSite(), lazy=True)
+        assert len(queries) == 0
+
+    assert PrefProxy.deferred_load is not None
+
+    Preference.objects.create(app='testapp', name='my_option_2', text='lazy')
+    get_app_prefs('testapp')['my_option_2'].db_value = 'stale'  # Drop value cache.
+
+    from siteprefs.tests.testapp import testmodule
+
+    with db_queries.scope() as queries:
+        assert testmodule.read_option_2() == 'lazy'
+        assert testmodule.read_option_2() == 'lazy'
+        assert len([sql for sql in queries.sql() if sql.startswith('SELECT')]) == 2  # Generation and values.
+
+    assert PrefProxy.deferred_load is None
+
+
+def test_preload(testapp_prefs, db_queries, monkeypatch):
+    from siteprefs import toolbox
+    from siteprefs.tests.testapp import testmodule
+
+    closed = []
+    monkeypatch.setattr(toolbox.connections, 'close_all', lambda: closed.append(True))
+
+    refresh_prefs(force=True)
+
+    generation = preload_prefs()
+    assert generation == Generation.get_value()
+    assert closed
+
+    pid = os.fork()
+
+    if not pid:  # Child.
+        os._exit(0 if PrefProxy.deferred_load is not None else 1)
+
+    assert os.waitpid(pid, 0)[1] == 0
+    assert PrefProxy.deferred_load is None
+
+    # Unchanged since preload: only generation is checked.
+    toolbox._on_fork()
+    value = testmodule.read_option_2()
+
+    with db_queries.scope() as queries:
+        toolbox._on_fork()
+        assert testmodule.read_option_2() == value
+        assert len(queries) == 1
+
+    # Changed since preload: values are reread.
+    Preference.objects.filter(app='testapp', name='my_option_2').update(text='after fork', data='after fork')
+    Generation.bump()
+
+    toolbox._on_fork()
+    assert testmodule.read_option_2() == 'after fork'
+    assert PrefProxy.deferred_load is None
+
+
+def test_lazy_admin(testapp_prefs):
+    __package__ = 'siteprefs.tests.testapp'
+    admin_site = AdminSite()
+
+    autodiscover_siteprefs(admin_site=admin_site, lazy_admin=True)
+    assert not admin_site._registry
+
+    assert admin_site.urls
+    assert 'testapp' in {model._meta.app_label for model in admin_site._registry}
+    assert 'get_urls' not in admin_site.__dict__
+
+    admin_site = AdminSite()
+    autodiscover_siteprefs(admin_site=admin_site, lazy_admin=True)
+    assert 'testapp' in get_prefs_models()
+    assert admin_site._registry
+
+    # Deferred twice.
+    admin_site = AdminSite()
+    autodiscover_siteprefs(admin_site=admin_site, lazy_admin=True)
+    autodiscover_siteprefs(admin_site=admin_site, lazy_admin=True)
+    assert admin_site.urls
+    assert admin_site._registry
+
+
+def test_preload_async(testapp_prefs, monkeypatch):
+    from siteprefs import toolbox
+
+    monkeypatch.setattr(toolbox.connections, 'close_all', lambda: None)
+
+    refresh_prefs(force=True)
+    preload_prefs()
+    toolbox._on_fork()
+
+    # Unchanged generation check clears deferred load, so that it's not called in event loop.
+    values = async_to_sync(aget_app_values)('testapp')
+    assert PrefProxy.deferred_load is None
+    assert async_to_sync(aget_app_values)('testapp', refresh=False) == values
+
+
+def test_update_prefs(db_queries):
+    Preference.objects.bulk_create([
+        Preference(app='myapp', name='one', text='1', data=1),
+        Preference(app='myapp', name='two', text='two', data='two'),
+        Preference(app='myapp', name='three', text='True'),  # No typed value yet.
+        Preference(app='other', name='one', text='1', data=1),
+    ])
+
+    def get_updates():
+        return [sql for sql in db_queries.sql() if sql.startswith('UPDATE "siteprefs_preference"')]
+
+    db_queries.clear()
+    changed = Preference.update_prefs(app='myapp', updated_prefs={'one': 1, 'two': 'two', 'three': True})
+    assert changed == ['three']
+    assert Preference.objects.get(app='myapp', name='three').data is True
+
+    db_queries.clear()
+    changed = Preference.update_prefs(app='myapp', updated_prefs={'one': 1, 'two': 'two', 'three': True})
+    assert changed == []
+    assert get_updates() == []
+
+    changed = Preference.update_prefs(app='myapp', updated_prefs={'one': 2, 'two': 'new', 'three': True})
+    assert sorted(changed) == ['one', 'two']
+    assert len(get_updates()) == 1
+
+    assert dict(Preference.objects.filter(app='myapp').values_list('name', 'text')) == {
+        'one': '2', 'two': 'new', 'three': 'True'}
+    assert dict(Preference.objects.filter(app='myapp').values_list('name', 'data')) == {
+        'one': 2, 'two': 'new', 'three': True}
+    assert Preference.objects.get(app='other').text == '1'
+
+    # Changes are logged.
+    generation = Generation.get_value()
+    changes = PreferenceChange.get_changes(since_generation=generation - 1)
+    assert sorted((change.name, change.value) for change in changes) == [('one', 2), ('two', 'new')]
+    assert {change.generation for change in changes} == {generation}
+
+
+def test_refresh_from_changes(testapp_prefs, db_queries):
+    from siteprefs.tests.testapp import testmodule
+
+    refresh_prefs(force=True)
+    generation = Generation.get_value()
+
+    Preference.update_prefs(app='testapp', updated_prefs={'my_option_2': 'logged'})
+    Preference.update_prefs(app='testapp', updated_prefs={'my_option_2': 'logged again'})
+    assert [change.generation for change in PreferenceChange.get_changes()][-2:] == [generation + 1, generation + 2]
+
+    with db_queries.scope() as queries:
+        assert refresh_prefs()
+        assert len(queries) == 2  # Generation and changes.
+        assert 'siteprefs_preferencechange' in queries.sql()[1]
+
+    assert testmodule.read_option_2() == 'logged again'
+
+    # Changes of a generation are pruned.
+    Preference.update_prefs(app='testapp', updated_prefs={'my_option_2': 'pruned'})
+    assert PreferenceChange.prune(keep=0)
+    assert not PreferenceChange.get_changes().exists()
+
+    with db_queries.scope() as queries:
+        assert refresh_prefs()
+        assert len(queries) == 3  # Generation, changes and all values.
+
+    assert testmodule.read_option_2() == 'pruned'
+
+    # Bumped without logging.
+    Preference.objects.filter(app='testapp', name='my_option_2').update(text='not logged', data='not logged')
+    Generation.bump()
+    assert refresh_prefs()
+    assert testmodule.read_option_2() == 'not logged'
+
+
+def test_module_proxy(testapp_prefs):
+    from siteprefs.tests.testapp import settings as module
+
+    assert isinstance(module, ModuleProxy)
+
+    module_dict = vars(module)
+    assert module_dict['NOT_AN_OPTION'] == 'not-an-option'
+    assert module_dict['__name__'] == 'siteprefs.tests.testapp.settings'
+    assert 'MY_OPTION_1' not in module_dict
+    assert module.MY_OPTION_1 is True
+
+    # Reassignment through the proxy reaches the module.
+    module.NOT_AN_OPTION = 'reassigned'
+    try:
+        assert module.NOT_AN_OPTION == 'reassigned'
+        assert module._module.NOT_AN_OPTION == 'reassigned'
+    finally:
+        module.NOT_AN_OPTION = 'not-an-option'
+
+    module._module.LATE_OPTION = 'late'
+    assert 'LATE_OPTION' not in module_dict
+    assert module.LATE_OPTION == 'late'
+    assert module_dict['LATE_OPTION'] == 'late'
+
+    with pytest.raises(AttributeError):
+        module.UNKNOWN
+
+
+def test_registration_single_pass(monkeypatch):
+    from siteprefs import toolbox
+
+    calls = []
+    traverse = toolbox.traverse_local_prefs
+
+    def traverse_counted(stepback):
+        calls.append(stepback)
+        return traverse(stepback)  # Generator frame is bound to the consumer.
+
+    monkeypatch.setattr(toolbox, 'traverse_local_prefs', traverse_counted)
+
+    module_name = 'dynamic.singlepass.settings'
+    module = ModuleType(module_name)
+    monkeypatch.setitem(sys.modules, module_name, module)
+
+    exec('\n'.join([
+        'from siteprefs.toolbox import preferences',
+        *[f'OPT_{idx} = {idx}' for idx in range(10)],
+        'with preferences() as prefs:',
+        '    prefs(%s)' % ', '.join(f'prefs.one(OPT_{idx}, static=False)' for idx in range(10)),
+    ]), vars(module))
+
+    assert len(calls) == 2  # Patch and unpatch.
+    assert len(get_app_prefs('singlepass')) == 10
+    assert sys.modules[module_name].OPT_5 == 5
+
+
+def test_bind_module_prefs(monkeypatch):
+    module_name = 'dynamic.explicit.settings'
+    module = ModuleType(module_name)
+    module.OPT_1 = 1
+    module.OPT_2 = 'two'
+    module.NOT_AN_OPTION = 'no'
+    monkeypatch.setitem(sys.modules, module_name, module)
+
+    proxies = bind_module_prefs(module, ['OPT_1', 'OPT_2'], static=False)
+    assert [proxy.name for proxy in proxies] == ['OPT_1', 'OPT_2']
+    assert isinstance(module.OPT_1, PrefProxy)
+
+    # Already bound.
+    assert bind_module_prefs(module, ['OPT_1']) == []
+
+    proxies = bind_module_prefs(module, {'OPT_3': 3.5}, category='Group', app='customapp')
+    assert proxies[0].category == 'Group'
+    assert module.OPT_3.value == 3.5
+
+    assert list(get_app_prefs('explicit')) == ['opt_1', 'opt_2']
+    assert list(get_app_prefs('customapp')) == ['opt_3']
+
+    proxied = proxy_module(module)
+    assert sys.modules[module_name] is proxied
+    assert proxied.OPT_1 == 1
+    assert proxied.OPT_3 == 3.5
+    assert proxied.NOT_AN_OPTION == 'no'
+
+    get_app_prefs('explicit')['opt_2'].db_value = 'other'
+    assert proxied.OPT_2 == 'other'
+
+    model = get_pref_model_class('explicit', get_app_prefs('explicit'), get_app_prefs)
+    assert [field.name for field in model._meta.fields][1:] == ['opt_1', 'opt_2']
+
+
+def test_bind_module_prefs_field(monkeypatch):
+    module_name = 'dynamic.shared_field.settings'
+    module = ModuleType(module_name)
+    module.OPT_1 = 'one'
+    module.OPT_2 = 'two'
+    monkeypatch.setitem(sys.modules, module_name, module)
+
+    field = models.CharField(max_length=10)
+    proxy_1, proxy_2 = bind_module_prefs(module, ['OPT_1', 'OPT_2'], field=field, static=False)
+
+    assert proxy_1.field is not proxy_2.field
+    assert proxy_1.field.verbose_name == 'Opt 1'
+    assert proxy_2.field.verbose_name == 'Opt 2'
+    assert proxy_1.field.max_length == proxy_2.field.max_length == 10
+
+    model = get_pref_model_class('shared_field', get_app_prefs('shared_field'), get_app_prefs)
+    assert [field.name for field in model._meta.fields][1:] == ['opt_1', 'opt_2']
+
+
+def test_async(testapp_prefs):
+    from siteprefs.tests.testapp import testmodule
+
+    assert async_to_sync(arefresh_prefs)(force=True)
+    assert not async_to_sync(arefresh_prefs)()
+
+    assert async_to_sync(asave_app_prefs)('testapp', {'my_option_2': 'async'}) == ['my_option_2']
+    assert async_to_sync(asave_app_prefs)('testapp', {'my_option_2': 'async'}) == []
+    assert testmodule.read_option_2() == 'async'
+    assert Preference.objects.get(app='testapp', name='my_option_2').value == 'async'
+
+    # Own save doesn't cause full reread.
+    assert not async_to_sync(arefresh_prefs)()
+
+    Preference.objects.filter(app='testapp', name='my_option_2').update(text='other', data='other')
+    Generation.bump()
+
+    values = async_to_sync(aget_app_values)('testapp')
+    assert values == {'my_option_1': True, 'my_option_2': 'other', 'my_option_42': 42}
+
+    mem_prefs = {'asyncapp': {'one': PrefProxy('one', 1, static=False)}}
+    async_to_sync(Preference.aread_prefs)(mem_prefs)
+    assert Preference.objects.get(app='asyncapp').value == 1
+
+    Preference.objects.filter(app='asyncapp').update(text='2', data=2)
+    async_to_sync(Preference.aread_app_prefs)('asyncapp', mem_prefs['asyncapp'])
+    assert mem_prefs['asyncapp']['one'].value == 2
+
+
+def test_async_without_async_orm(monkeypatch):
+    from siteprefs import models as models_module
+
+    monkeypatch.setattr(models_module, 'ASYNC_ORM', False)
+
+    assert async_to_sync(arefresh_prefs)(force=True)
+    assert async_to_sync(Generation.aget_value)() == Generation.get_value()
+
+    mem_prefs = {'asyncapp': {'one': PrefProxy('one', 1, static=False)}}
+    async_to_sync(Preference.aread_prefs)(mem_prefs)
+    Preference.objects.filter(app='asyncapp').update(text='3', data=3)
+    assert async_to_sync(Preference.aread_app_prefs)('asyncapp', mem_prefs['asyncapp']) == 1
+    assert mem_prefs['asyncapp']['one'].value == 3
+
+
+def test_snapshot_middleware(testapp_prefs, request_get):
+    from siteprefs.middleware import prefs_snapshot_middleware
+
+    refresh_prefs(force=True)
+    proxy = get_app_prefs('testapp')['my_option_2']
+    proxy.db_value = 'before'
+
+    snapshot = get_prefs_snapshot()
+    assert get_prefs_snapshot() is snapshot
+    assert snapshot['testapp']['my_option_2'] == 'before'
+
+    with pytest.raises(TypeError):
+        snapshot['testapp']['my_option_2'] = 'changed'
+
+    def view(request):
+        assert request.siteprefs is get_request_prefs()
+        proxy.db_value = 'after'  # E.g. a refresh in another thread.
+        assert get_request_prefs('testapp')['my_option_2'] == 'before'
+        assert get_request_prefs('unknown') == {}
+        return 'response'
+
+    assert prefs_snapshot_middleware(view)(request_get()) == 'response'
+    assert get_request_prefs('testapp')['my_option_2'] == 'after'
+
+    async def aview(request):
+        proxy.db_value = 'async'
+        return get_request_prefs('testapp')['my_option_2']
+
+    assert async_to_sync(prefs_snapshot_middleware(aview))(request_get()) == 'after'
+    assert get_request_prefs('testapp')['my_option_2'] == 'async'
+
+
+def test_admin_get_object(testapp_prefs, recwarn):
+    from siteprefs.tests.testapp import testmodule
+
+    app_prefs = get_app_prefs('testapp')
+    model = get_pref_model_class('testapp', app_prefs, get_app_prefs)
+    model_admin = get_pref_model_admin_class(app_prefs)(model, AdminSite())
+
+    obj = model_admin.get_object(None, '')
+    assert obj.my_option_2 == testmodule.read_option_2()
+    assert not [warning for warning in recwarn if warning.category is DeprecationWarning]
+
+    app_prefs['my_option_2'].db_value = 'changed'
+    assert model_admin.get_object(None, '').my_option_2 == 'changed'
 
 
 def test_admin():
@@ -105,6 +615,61 @@ class TestUtils:
         pp = PrefProxy('proxy_name_3', 10, static=False)
         assert not pp.readonly
 
+    def test_pref_proxy_value_cache(self, monkeypatch):
+        pp = PrefProxy('proxy_name', 10, static=False)
+
+        calls = []
+        to_python = pp.field.to_python
+        monkeypatch.setattr(pp.field, 'to_python', lambda value: calls.append(value) or to_python(value))
+
+        assert pp.value == 10
+        assert pp.value == 10
+        assert calls == [10]
+
+        with pytest.raises(AttributeError):
+            pp.db_value
+
+        pp.db_value = '42'
+        assert pp.db_value == '42'
+        assert pp.value == 42
+        assert pp.value == 42
+        assert calls == [10, '42']
+
+    def test_memory_footprint(self):
+
+        def get_footprint(cls, *args):
+            tracemalloc.start()
+            try:
+                objects = [cls(*args) for _ in range(1000)]
+                return tracemalloc.get_traced_memory()[0] / len(objects)
+            finally:
+                tracemalloc.stop()
+
+        assert not hasattr(PatchedLocal('k', 'v'), '__dict__')
+        assert not hasattr(PrefProxy('proxy_name', 10), '__dict__')
+
+        assert get_footprint(PatchedLocal, 'k', 'v') < 80
+        assert get_footprint(PrefProxy, 'proxy_name', 10) < 1024  # Field object included.
+
+    def test_publish_values(self):
+        pp_1 = PrefProxy('proxy_one', 1, static=False)
+        pp_2 = PrefProxy('proxy_two', 2, static=False)
+        assert pp_1.slot != pp_2.slot
+
+        values = PrefProxy.values
+        snapshot = get_prefs_snapshot()
+
+        publish_values([(pp_1, '10'), (pp_2, '20')])
+
+        # Published map is replaced as a whole, never changed in place.
+        assert PrefProxy.values is not values
+        assert pp_1.slot not in values
+        assert PrefProxy.values[pp_1.slot] == 10
+        assert get_prefs_snapshot() is not snapshot
+
+        assert (pp_1.value, pp_2.value) == (10, 20)
+        assert pp_1.db_value == '10'
+
     def test_get_field_for_proxy(self):
         pp = PrefProxy('proxy_name', 10)
         assert isinstance(get_field_for_proxy(pp), models.IntegerField)
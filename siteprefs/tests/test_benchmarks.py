@@ -0,0 +1,123 @@
+import os
+import warnings
+from itertools import count
+from timeit import Timer
+
+import pytest
+from django.contrib.admin import AdminSite
+
+from siteprefs.models import Preference
+from siteprefs.toolbox import autodiscover_siteprefs
+from siteprefs.utils import PrefProxy
+
+pytest.importorskip('pytest_benchmark')
+
+pytestmark = pytest.mark.skipif(
+    "not config.pluginmanager.hasplugin('benchmark') or "
+    "not (config.getoption('benchmark_only', False) or os.environ.get('SITEPREFS_BENCHMARKS'))",
+    reason='Benchmarks are run with --benchmark-only or SITEPREFS_BENCHMARKS=1.')
+
+
+PREFS_COUNTS = [10, 1000, 10000]
+
+
+def make_prefs(number: int, app: str = 'benchapp') -> dict:
+    prefs = {f'pref_{idx}': PrefProxy(f'PREF_{idx}', idx, static=False) for idx in range(number)}
+    return {app: prefs}
+
+
+def count_queries(db_queries, func, *args, **kwargs) -> int:
+    with db_queries.scope() as queries:
+        func(*args, **kwargs)
+        return len([sql for sql in queries.sql() if not sql.startswith(('SAVEPOINT', 'RELEASE SAVEPOINT'))])
+
+
+@pytest.fixture
+def settings_module(testapp_prefs):
+    # Settings module is swapped for ModuleProxy on import.
+    from siteprefs.tests.testapp import settings
+    return settings
+
+
+def test_proxy_value(benchmark):
+    pp = PrefProxy('proxy_name', 10, static=False)
+    pp.db_value = '42'
+
+    assert benchmark(lambda: pp.value) == 42
+
+
+def test_proxy_value_static(benchmark):
+    pp = PrefProxy('proxy_name', 10)
+
+    assert benchmark(lambda: pp.value) == 10
+
+
+def test_mimic_operators(benchmark):
+    pp = PrefProxy('proxy_name', 10, static=False)
+    pp.db_value = '42'
+
+    def operate():
+        return bool(pp), pp == 42, pp + 1, 1 + pp, pp < 50, int(pp)
+
+    assert benchmark(operate) == (True, True, 43, 43, True, 42)
+
+
+def test_module_proxy_pref(benchmark, settings_module):
+    assert benchmark(getattr, settings_module, 'MY_OPTION_42') == 42
+
+
+def test_module_proxy_not_pref(benchmark, settings_module):
+    assert benchmark(getattr, settings_module, 'NOT_AN_OPTION') == 'not-an-option'
+
+    # Served natively, faster than through __getattr__ as before.
+    timer_native = Timer('module.NOT_AN_OPTION', globals={'module': settings_module})
+    timer_dynamic = Timer("getattr_('NOT_AN_OPTION')", globals={'getattr_': settings_module.__getattr__})
+    assert min(timer_native.repeat(5, 10000)) < min(timer_dynamic.repeat(5, 10000))
+
+
+@pytest.mark.parametrize('number', PREFS_COUNTS)
+def test_read_prefs(benchmark, db_queries, number):
+    mem_prefs = make_prefs(number)
+
+    Preference.read_prefs(mem_prefs)  # Create DB entries.
+
+    queries = count_queries(db_queries, Preference.read_prefs, mem_prefs)
+    benchmark.extra_info['queries'] = queries
+    assert queries == 1
+
+    benchmark.pedantic(Preference.read_prefs, args=(mem_prefs,), rounds=5, iterations=1)
+
+
+@pytest.mark.parametrize('number', PREFS_COUNTS)
+def test_update_prefs(benchmark, db_queries, number):
+    mem_prefs = make_prefs(number)
+    Preference.read_prefs(mem_prefs)
+
+    names = list(mem_prefs['benchapp'])
+    counter = count(1)
+
+    def get_kwargs():
+        # Fresh values for every round so that all preferences are written.
+        shift = next(counter) * number
+        return (), {'app': 'benchapp', 'updated_prefs': {name: idx + shift for idx, name in enumerate(names)}}
+
+    benchmark.extra_info['queries'] = count_queries(db_queries, Preference.update_prefs, **get_kwargs()[1])
+
+    benchmark.pedantic(Preference.update_prefs, setup=get_kwargs, rounds=5, iterations=1)
+
+
+def test_autodiscover(benchmark, db_queries):
+
+    def discover():
+        __package__ = 'siteprefs.tests.testapp'
+
+        with warnings.catch_warnings():
+            # Dynamic preferences models are recreated on every run.
+            warnings.simplefilter('ignore', RuntimeWarning)
+            autodiscover_siteprefs(admin_site=AdminSite())
+
+    discover()
+
+    benchmark.extra_info['queries'] = count_queries(db_queries, discover)
+
+    benchmark(discover)
@@ -0,0 +1,100 @@
+import json
+from io import StringIO
+
+import pytest
+from django.core.management import call_command, CommandError
+
+from siteprefs.models import Preference, PreferenceChange
+from siteprefs.toolbox import register_proxy, get_app_prefs
+from siteprefs.utils import PrefProxy
+
+
+@pytest.fixture
+def import_prefs():
+    prefs = get_app_prefs('importapp')
+
+    if not prefs:
+        register_proxy('importapp', PrefProxy('NUMBER', 1, static=False))
+        register_proxy('importapp', PrefProxy('TITLE', 'one', static=False))
+        register_proxy('importapp', PrefProxy('STATIC', 'yes'))
+
+    return get_app_prefs('importapp')
+
+
+def make_lines(*entries) -> str:
+    return ''.join(json.dumps(dict(zip(('app', 'name', 'value'), entry))) + '\n' for entry in entries)
+
+
+def test_export_import(import_prefs, tmp_path):
+    Preference.write_prefs({'importapp': {'number': 10, 'title': 'ten'}, 'otherapp': {'opt': True}}, create=True)
+
+    out = StringIO()
+    call_command('siteprefs_export', 'importapp', stdout=out)
+    assert [json.loads(line) for line in out.getvalue().splitlines()] == [
+        {'app': 'importapp', 'name': 'number', 'value': 10},
+        {'app': 'importapp', 'name': 'title', 'value': 'ten'},
+    ]
+
+    path = tmp_path / 'prefs.jsonl'
+    path.write_text(make_lines(
+        ('importapp', 'number', '42'),
+        ('importapp', 'title', 'ten'),  # Unchanged.
+        ('importapp', 'static', 'no'),  # Skipped.
+        ('importapp', 'unknown', 1),  # Skipped.
+        ('otherapp', 'opt', False),  # Filtered out by app.
+    ))
+
+    out = StringIO()
+    call_command('siteprefs_import', str(path), app=['importapp'], stdout=out, stderr=StringIO())
+    assert out.getvalue().strip() == 'Changed: 1. Skipped: 2.'
+
+    assert import_prefs['number'].value == 42
+    assert Preference.objects.get(app='importapp', name='number').data == 42
+    assert Preference.objects.get(app='otherapp', name='opt').data is True
+
+    # Round trip through a file.
+    export_path = tmp_path / 'export.jsonl'
+    call_command('siteprefs_export', output=str(export_path), stdout=StringIO())
+    assert json.loads(export_path.read_text().splitlines()[0]) == {'app': 'importapp', 'name': 'number', 'value': 42}
+
+
+def test_export_import_empty(import_prefs, tmp_path):
+    Preference.write_prefs({'importapp': {'number': 1, 'title': ''}}, create=True)
+
+    path = tmp_path / 'export.jsonl'
+    call_command('siteprefs_export', 'importapp', output=str(path), stdout=StringIO())
+    assert '"value": ""' in path.read_text()
+
+    Preference.write_prefs({'importapp': {'title': 'changed'}})
+
+    out = StringIO()
+    call_command('siteprefs_import', str(path), stdout=out)
+    assert out.getvalue().strip() == 'Changed: 1. Skipped: 0.'
+    assert import_prefs['title'].value == ''
+
+
+def test_import_invalid(import_prefs, tmp_path):
+    path = tmp_path / 'prefs.jsonl'
+
+    path.write_text(make_lines(('importapp', 'title', 'valid'), ('importapp', 'number', 'NaN')))
+
+    with pytest.raises(CommandError, match='Line 2: invalid value for importapp.number'):
+        call_command('siteprefs_import', str(path), stdout=StringIO())
+
+    # Nothing is written if any value is invalid.
+    assert not Preference.objects.filter(app='importapp', name='title', text='valid').exists()
+
+    path.write_text('{"app": "importapp"}\n')
+
+    with pytest.raises(CommandError, match='Line 1: malformed entry'):
+        call_command('siteprefs_import', str(path), stdout=StringIO())
+
+
+def test_prune_changes(import_prefs):
+    for idx in range(3):
+        Preference.write_prefs({'importapp': {'number': idx}}, create=True)
+
+    out = StringIO()
+    call_command('siteprefs_prune_changes', keep=1, stdout=out)
+    assert out.getvalue().strip() == 'Deleted: 2'
+    assert [change.value for change in PreferenceChange.get_changes()] == [2]
@@ -0,0 +1,56 @@
+import pytest
+
+from siteprefs.metrics import get_metrics, reset_metrics, set_metrics_callback, enable_reads_counting, record
+from siteprefs.models import Generation
+from siteprefs.toolbox import refresh_prefs, save_app_prefs
+
+
+@pytest.fixture
+def metrics():
+    reset_metrics()
+    events = []
+    set_metrics_callback(lambda event, data: events.append((event, data)))
+
+    yield events
+
+    set_metrics_callback(None)
+    enable_reads_counting(False)
+    reset_metrics()
+
+
+def test_metrics(testapp_prefs, metrics):
+    from siteprefs.tests.testapp import testmodule
+
+    refresh_prefs(force=True)
+    refresh_prefs()
+    save_app_prefs('testapp', {'my_option_2': 'metered'})
+    Generation.bump()
+    refresh_prefs()
+
+    events = get_metrics()['events']
+
+    assert events['refresh'] == {'count': 3, 'reread': 2}
+    assert events['read_prefs']['count'] == 2
+    assert 'rows' in events['read_prefs']
+    assert events['read_app_prefs']['rows'] == 1
+    assert events['update_prefs']['changed'] == 1
+    assert events['update_prefs']['queries'] >= 2
+    assert events['update_prefs']['duration'] > 0
+
+    assert [event for event, _ in metrics] == [
+        'read_prefs', 'refresh', 'refresh', 'update_prefs', 'read_app_prefs',
+        'read_changes', 'read_prefs', 'refresh']  # Bump without logged changes leads to full reread.
+    assert set(metrics[0][1]) == {'rows', 'duration'}
+
+    # Reads are not counted by default.
+    assert testmodule.read_option_2() == 'metered'
+    assert get_metrics()['reads'] == {}
+
+    enable_reads_counting()
+    testmodule.read_option_2()
+    testmodule.read_option_2()
+    assert get_metrics()['reads'] == {'testapp.my_option_2': 2}
+
+    reset_metrics()
+    record('custom', value=3, label='any')
+    assert get_metrics() == {'events': {'custom': {'count': 1, 'value': 3}}, 'reads': {}}
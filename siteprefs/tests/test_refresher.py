@@ -0,0 +1,81 @@
+from threading import Event
+
+from django.core.signals import request_started
+
+from siteprefs import refresher as refresher_module
+from siteprefs.refresher import PrefsRefresher, start_refresher, stop_refresher, start_refresher_on_request
+from siteprefs.utils import PrefProxy
+
+
+def test_delay():
+    refresher = PrefsRefresher(10, jitter=0.2)
+
+    delays = {refresher.get_delay() for _ in range(50)}
+    assert all(8 <= delay <= 12 for delay in delays)
+    assert len(delays) > 1
+
+    assert PrefsRefresher(10).get_delay() == 10
+
+
+def test_refresher(monkeypatch):
+    refreshed = Event()
+    calls = []
+
+    def refresh_prefs():
+        calls.append(1)
+
+        if len(calls) == 1:
+            raise ValueError('first call fails')
+
+        refreshed.set()
+
+    monkeypatch.setattr(refresher_module, 'refresh_prefs', refresh_prefs)
+
+    refresher = start_refresher(0.01, jitter=0.5)
+
+    try:
+        assert refresher.daemon
+        assert refreshed.wait(5)  # Keeps running after a failure.
+
+        # Restart replaces the thread.
+        restarted = start_refresher(0.01)
+        assert restarted is not refresher
+        refresher.join(5)
+        assert not refresher.is_alive()
+
+    finally:
+        stop_refresher(timeout=5)
+
+    assert not restarted.is_alive()
+    assert len(calls) >= 2
+
+
+def test_refresher_deferred(monkeypatch):
+    refreshed = Event()
+
+    monkeypatch.setattr(refresher_module, 'refresh_prefs', refreshed.set)
+    monkeypatch.setattr(PrefProxy, 'deferred_load', lambda: None)
+
+    start_refresher(0.01)
+
+    try:
+        assert not refreshed.wait(0.1)  # Not loaded yet.
+
+        PrefProxy.deferred_load = None
+        assert refreshed.wait(5)
+
+    finally:
+        stop_refresher(timeout=5)
+
+
+def test_refresher_on_request(monkeypatch):
+    started = []
+
+    monkeypatch.setattr(refresher_module, 'start_refresher', lambda: started.append(True))
+
+    start_refresher_on_request()
+    assert not started
+
+    request_started.send(sender=None)
+    request_started.send(sender=None)
+    assert started == [True]
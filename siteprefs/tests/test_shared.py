@@ -0,0 +1,113 @@
+import os
+from datetime import datetime
+from threading import Thread
+
+import pytest
+from django.db import models
+
+from siteprefs.models import Generation
+from siteprefs.shared import SharedSnapshot
+from siteprefs.toolbox import refresh_prefs, set_shared_snapshot, save_app_prefs
+from siteprefs.utils import PrefProxy
+
+
+@pytest.fixture
+def shared_path(tmp_path):
+    path = str(tmp_path / 'siteprefs.snapshot')
+    yield path
+    set_shared_snapshot(None)
+
+
+def test_shared_snapshot(shared_path):
+    reader = SharedSnapshot(shared_path)
+    assert reader.get_generation() is None
+    assert reader.read() is None
+
+    writer = SharedSnapshot(shared_path)
+    assert writer.write(3, {'myapp': {'one': 1}})
+
+    assert reader.get_generation() == 3
+    assert reader.read() == (3, {'myapp': {'one': 1}})
+
+    # Older generation is not written over a newer one.
+    assert not writer.write(2, {'myapp': {'one': 0}})
+
+    assert writer.write(4, {'myapp': {'one': 'four'}})
+    assert reader.read() == (4, {'myapp': {'one': 'four'}})
+
+    # No precision loss.
+    stamp = datetime(2021, 12, 18, 10, 30, 15, 123456)
+    assert writer.write(5, {'myapp': {'stamp': stamp, 'time': stamp.time()}})
+    values = reader.read()[1]['myapp']
+    assert PrefProxy('stamp', stamp, static=False).field.to_python(values['stamp']) == stamp
+    assert models.TimeField().to_python(values['time']) == stamp.time()
+
+    reader.close()
+    writer.close()
+
+
+def test_shared_snapshot_concurrent(shared_path):
+    writers = [SharedSnapshot(shared_path) for _ in range(4)]
+
+    def write(writer):
+        for generation in range(20):
+            writer.write(generation, {'myapp': {'one': 'x' * 1000 * generation}})
+
+    threads = [Thread(target=write, args=(writer,)) for writer in writers]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    reader = SharedSnapshot(shared_path)
+    assert reader.read()[0] == 19
+    assert not [name for name in os.listdir(os.path.dirname(shared_path)) if name.endswith('.tmp')]
+
+    # Damaged file is considered no snapshot.
+    with open(shared_path, 'r+b') as f:
+        f.seek(SharedSnapshot.header.size)
+        f.write(b'{{{')
+
+    reader.close()
+    assert reader.read() is None
+
+
+def test_refresh_from_shared(testapp_prefs, shared_path, db_queries):
+    from siteprefs.tests.testapp import testmodule
+
+    shared = set_shared_snapshot(shared_path)
+
+    # Initial load is from DB. Snapshot is written.
+    assert refresh_prefs(force=True)
+    generation, values = shared.read()
+    assert values['testapp'] == {'my_option_2': testmodule.read_option_2()}
+
+    # Own save updates snapshot.
+    save_app_prefs('testapp', {'my_option_2': 'saved'})
+    assert shared.read() == (generation + 1, {**values, 'testapp': {'my_option_2': 'saved'}})
+
+    # A sibling process wrote a new snapshot.
+    sibling = SharedSnapshot(shared_path)
+    sibling.write(generation + 2, {**values, 'testapp': {'my_option_2': 'from sibling'}})
+
+    with db_queries.scope() as queries:
+        assert refresh_prefs()
+        assert len(queries) == 0
+
+    assert testmodule.read_option_2() == 'from sibling'
+
+    # Snapshot not covering all preferences is ignored.
+    sibling.write(generation + 3, {'testapp': {}})
+    Generation.bump()
+    Generation.bump()
+
+    with db_queries.scope() as queries:
+        assert refresh_prefs()
+        assert len(queries) == 3  # Generation, changes log and values.
+
+    assert testmodule.read_option_2() == 'saved'
+    assert shared.get_generation() == generation + 3
+
+    sibling.close()
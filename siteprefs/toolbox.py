@@ -1,40 +1,140 @@
 import logging
+import os
 import sys
 from collections import OrderedDict
-from types import ModuleType
-from typing import Dict, Union, List, Tuple, Any, Optional
+from contextvars import ContextVar
+from threading import Lock
+from types import ModuleType, MappingProxyType
+from typing import Dict, Union, List, Tuple, Any, Optional, Iterable, Mapping
 
 from django.contrib import admin
 from django.contrib.admin import AdminSite
-from django.db import DatabaseError
+from django.db import DatabaseError, connections
 from django.db.models import Model, Field
 
 from .exceptions import SitePrefsException
-from .models import Preference
+from .metrics import measure, record
+from .backends import get_backend
+from .settings import LAZY_LOAD, SHARED_SNAPSHOT, LAZY_ADMIN
+from .shared import SharedSnapshot
 from .signals import prefs_save
 from .utils import import_prefs, get_frame_locals, traverse_local_prefs, get_pref_model_admin_class, \
-    get_pref_model_class, PrefProxy, PatchedLocal, Frame
+    get_pref_model_class, PrefProxy, PatchedLocal, Frame, publish_values
 
 __PATCHED_LOCALS_SENTINEL = '__siteprefs_locals_patched'
 
 __PREFS_REGISTRY = None
 __PREFS_DEFAULT_REGISTRY = OrderedDict()
 __MODELS_REGISTRY = {}
+__PREFS_GENERATION = None
+__LOAD_LOCK = Lock()
+__FORK_HOOKED = False
+__ADMIN_PENDING = []
+__ADMIN_LOCK = Lock()
+__SNAPSHOT = (None, MappingProxyType({}))
+__REQUEST_SNAPSHOT = ContextVar('siteprefs_request_snapshot', default=None)
+__SHARED_SNAPSHOT = SharedSnapshot(SHARED_SNAPSHOT) if SHARED_SNAPSHOT else None
 
 LOGGER = logging.getLogger(__name__)
 
 
 def on_pref_update(*args, **kwargs):
     """Triggered on dynamic preferences model save.
-     Issues DB save and reread.
+     Issues DB save, generation bump and reread of changed preferences.
 
     """
-    Preference.update_prefs(*args, **kwargs)
-    Preference.read_prefs(get_prefs())
+    save_app_prefs(kwargs['app'], kwargs['updated_prefs'])
 
 prefs_save.connect(on_pref_update)
 
 
+def save_app_prefs(app: str, values: dict) -> List[str]:
+    """Saves values of preferences of a certain app into DB
+    and rereads changed ones. Returns names of changed preferences.
+
+    :param app: Application name.
+
+    :param values: Preferences values indexed by preferences names.
+
+    """
+    return [pref_name for _, pref_name in save_prefs({app: values})]
+
+
+def save_prefs(values: Dict[str, dict], create: bool = False, batch_size: int = None) -> List[Tuple[str, str]]:
+    """Saves values of preferences of several apps into DB
+    and rereads changed ones. Returns (app, name) pairs of changed preferences.
+
+    :param values: Values indexed by application names and preferences names.
+
+    :param create: Create entries missing in DB.
+
+    :param batch_size: Max number of entries to write in one query.
+
+    """
+    backend = get_backend()
+
+    with measure('update_prefs', model=backend.model) as data:
+        changed = backend.write_prefs(values, create=create, batch_size=batch_size)
+        data['changed'] = len(changed)
+
+    if changed:
+        generation_seen = __PREFS_GENERATION
+
+        changed_by_app = OrderedDict()
+
+        for app, pref_name in changed:
+            changed_by_app.setdefault(app, []).append(pref_name)
+
+        with measure('read_app_prefs') as data:
+            data['rows'] = sum(
+                backend.read_app_prefs(app, get_app_prefs(app), names=names)
+                for app, names in changed_by_app.items()
+            )
+
+        if _note_saved_generation(generation_seen, backend.get_version()):
+            _write_shared(generation_seen + 1)
+
+    return changed
+
+
+async def asave_app_prefs(app: str, values: dict) -> List[str]:
+    """Asynchronous version of ``save_app_prefs()``.
+
+    :param app: Application name.
+
+    :param values: Preferences values indexed by preferences names.
+
+    """
+    backend = get_backend()
+
+    with measure('update_prefs') as data:
+        changed = [pref_name for _, pref_name in await backend.awrite_prefs({app: values})]
+        data['changed'] = len(changed)
+
+    if changed:
+        generation_seen = __PREFS_GENERATION
+
+        with measure('read_app_prefs') as data:
+            data['rows'] = await backend.aread_app_prefs(app, get_app_prefs(app), names=changed)
+
+        if _note_saved_generation(generation_seen, await backend.aget_version()):
+            _write_shared(generation_seen + 1)
+
+    return changed
+
+
+def _note_saved_generation(generation_seen: Optional[int], generation: int) -> bool:
+    # Preferences are considered fresh after own save
+    # only if there were no changes from other processes since the last read.
+    global __PREFS_GENERATION
+
+    if generation_seen is not None and generation == generation_seen + 1:
+        __PREFS_GENERATION = generation
+        return True
+
+    return False
+
+
 def get_prefs() -> dict:
     """Returns a dictionary with all preferences discovered by siteprefs."""
     global __PREFS_REGISTRY
@@ -45,6 +145,298 @@ def get_prefs() -> dict:
     return __PREFS_REGISTRY
 
 
+def refresh_prefs(force: bool = False) -> bool:
+    """Rereads preferences from DB if they were changed
+    (probably by another process) since the last read.
+
+    If shared snapshot is configured (see ``set_shared_snapshot()``), values
+    are taken from it when possible instead of reading them from DB.
+
+    Otherwise, if changes log covers all changes since the last read,
+    only changed values are read. All preferences are reread if not.
+
+    Returns boolean indicating whether preferences were reread.
+
+    :param force: Reread preferences unconditionally.
+
+    """
+    if not force and _refresh_from_shared():
+        return True
+
+    backend = get_backend()
+    generation = backend.get_version()
+
+    if not force and generation == __PREFS_GENERATION:
+        record('refresh', reread=0)
+        PrefProxy.deferred_load = None  # Values preloaded before fork are fresh.
+        return False
+
+    if not _refresh_from_shared(generation):
+
+        if force or not _refresh_from_changes(generation):
+
+            with measure('read_prefs') as data:
+                data['rows'] = backend.read_prefs(get_prefs(), version=generation)
+
+            _note_refreshed(generation)
+
+        _write_shared(generation)
+
+    return True
+
+
+async def arefresh_prefs(force: bool = False) -> bool:
+    """Asynchronous version of ``refresh_prefs()``.
+
+    :param force: Reread preferences unconditionally.
+
+    """
+    if not force and _refresh_from_shared():
+        return True
+
+    backend = get_backend()
+    generation = await backend.aget_version()
+
+    if not force and generation == __PREFS_GENERATION:
+        record('refresh', reread=0)
+        PrefProxy.deferred_load = None  # Values preloaded before fork are fresh.
+        return False
+
+    if not _refresh_from_shared(generation):
+
+        if force or not await _arefresh_from_changes(generation):
+
+            with measure('read_prefs') as data:
+                data['rows'] = await backend.aread_prefs(get_prefs(), version=generation)
+
+            _note_refreshed(generation)
+
+        _write_shared(generation)
+
+    return True
+
+
+def _refresh_from_changes(generation: int) -> bool:
+    # Applies changes made since the generation we've seen up to the given one.
+    generation_seen = __PREFS_GENERATION
+
+    if generation_seen is None or generation < generation_seen:
+        return False
+
+    with measure('read_changes') as data:
+        rows = get_backend().read_changes(get_prefs(), generation_seen, generation)
+        data['rows'] = rows or 0
+
+    if rows is None:
+        return False
+
+    _note_refreshed(generation)
+
+    return True
+
+
+async def _arefresh_from_changes(generation: int) -> bool:
+    generation_seen = __PREFS_GENERATION
+
+    if generation_seen is None or generation < generation_seen:
+        return False
+
+    with measure('read_changes') as data:
+        rows = await get_backend().aread_changes(get_prefs(), generation_seen, generation)
+        data['rows'] = rows or 0
+
+    if rows is None:
+        return False
+
+    _note_refreshed(generation)
+
+    return True
+
+
+def _note_refreshed(generation: int):
+    global __PREFS_GENERATION
+
+    record('refresh', reread=1)
+    __PREFS_GENERATION = generation
+    PrefProxy.deferred_load = None
+
+
+def set_shared_snapshot(path: Optional[str]) -> Optional[SharedSnapshot]:
+    """Sets a path to a shared preferences snapshot file
+    used by processes on the same host to exchange preferences values
+    without reading them from DB.
+
+    :param path: File path or None to disable shared snapshot.
+
+    """
+    global __SHARED_SNAPSHOT
+
+    shared = __SHARED_SNAPSHOT
+
+    if shared is not None:
+        shared.close()
+
+    shared = __SHARED_SNAPSHOT = None if path is None else SharedSnapshot(path)
+
+    return shared
+
+
+def _refresh_from_shared(generation: int = None) -> bool:
+    # Applies values from shared snapshot if it's of the given generation,
+    # or, if generation is not given, if it's newer than the one we've seen.
+    shared = __SHARED_SNAPSHOT
+
+    if shared is None:
+        return False
+
+    generation_seen = __PREFS_GENERATION
+
+    if generation is None and generation_seen is None:
+        # Snapshot may be stale, so initial load is always verified against DB.
+        return False
+
+    generation_shared = shared.get_generation()
+
+    if generation_shared is None:
+        return False
+
+    if generation is None:
+        if generation_shared <= generation_seen:
+            return False
+
+    elif generation_shared != generation:
+        return False
+
+    with measure('read_shared') as data:
+        snapshot = shared.read()
+        updates = None if snapshot is None else _get_shared_updates(snapshot[1])
+        data['rows'] = 0 if updates is None else len(updates)
+
+    if updates is None:
+        return False
+
+    publish_values(updates)
+
+    _note_refreshed(snapshot[0])
+
+    return True
+
+
+def _get_shared_updates(values: dict) -> Optional[List[Tuple[PrefProxy, Any]]]:
+    # Returns (proxy, value) pairs for all dynamic preferences
+    # or None if the snapshot doesn't cover some of them.
+    updates = []
+
+    for app, prefs in get_prefs().items():
+        app_values = values.get(app, {})
+
+        for pref_name, pref_proxy in prefs.items():
+
+            if pref_proxy.static:
+                continue
+
+            if pref_name not in app_values:
+                # Snapshot is written by a process not aware of this preference.
+                return None
+
+            updates.append((pref_proxy, app_values[pref_name]))
+
+    return updates
+
+
+def _write_shared(generation: int):
+    shared = __SHARED_SNAPSHOT
+
+    if shared is None:
+        return
+
+    values = {}
+
+    for app, prefs in get_prefs().items():
+        app_values = {
+            # Entries created from defaults have no value from DB.
+            pref_name: getattr(pref_proxy, 'db_value', pref_proxy.default)
+            for pref_name, pref_proxy in prefs.items()
+            if not pref_proxy.static
+        }
+
+        if app_values:
+            values[app] = app_values
+
+    try:
+        shared.write(generation, values)
+
+    except (TypeError, ValueError, OSError):
+        LOGGER.warning('Unable to write shared preferences snapshot. Skip.', exc_info=True)
+
+
+def load_deferred_prefs(force: bool = True):
+    """Reads preferences from DB deferred by lazy mode.
+    Called on the first dynamic preference value access.
+
+    :param force: Reread preferences unconditionally. If False, preferences
+        are reread only if they were changed since the last read (see ``preload_prefs()``).
+
+    """
+    with __LOAD_LOCK:
+
+        if PrefProxy.deferred_load is None:  # Already loaded by another thread.
+            return
+
+        try:
+            refresh_prefs(force=force)
+
+        except DatabaseError:
+            LOGGER.warning('Unable to read preferences from database. Skip.')
+
+        PrefProxy.deferred_load = None
+
+
+def preload_prefs() -> Optional[int]:
+    """Prepares preferences loaded in a parent process to be inherited by forked children,
+    e.g. by workers of a web server preloading an application.
+
+    Loads preferences if not yet loaded and closes DB connections not to share them with children.
+    Children then skip initial load: on the first dynamic preference value access they
+    only check preferences generation and reread values if they were changed after preload.
+
+    Returns preferences generation number loaded.
+
+    .. code-block:: python
+
+        # wsgi.py
+        application = get_wsgi_application()
+        preload_prefs()
+
+    """
+    global __FORK_HOOKED
+
+    if __PREFS_GENERATION is None:
+        refresh_prefs(force=True)
+
+    connections.close_all()
+
+    if not __FORK_HOOKED and hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_on_fork)
+        __FORK_HOOKED = True
+
+    return __PREFS_GENERATION
+
+
+def _on_fork():
+    global __LOAD_LOCK
+
+    # The lock could have been held by another thread at the moment of fork.
+    __LOAD_LOCK = Lock()
+
+    if __PREFS_GENERATION is not None:
+        PrefProxy.deferred_load = _check_preloaded
+
+
+def _check_preloaded():
+    load_deferred_prefs(force=False)
+
+
 def get_app_prefs(app: str = None) -> dict:
     """Returns a dictionary with preferences for a certain app/module.
 
@@ -64,11 +456,132 @@ def get_app_prefs(app: str = None) -> dict:
     return prefs[app]
 
 
+def get_app_values(app: str) -> Dict[str, Any]:
+    """Returns values of preferences of a certain app indexed by preferences names.
+
+    :param app: Application name.
+
+    """
+    if PrefProxy.deferred_load is not None:
+        PrefProxy.deferred_load()
+
+    return _get_values(get_app_prefs(app), PrefProxy.values)
+
+
+def _get_values(prefs: dict, values: Dict[int, Any]) -> Dict[str, Any]:
+    # Takes values from the given published values map
+    # so that they are consistent even if a refresh is in progress.
+    return {
+        pref_name: values[pref_proxy.slot] if pref_proxy.slot in values else pref_proxy.value
+        for pref_name, pref_proxy in prefs.items()
+    }
+
+
+async def aget_app_values(app: str, refresh: bool = True) -> Dict[str, Any]:
+    """Asynchronous version of ``get_app_values()``.
+
+    :param app: Application name.
+
+    :param refresh: Reread preferences beforehand if they were changed by another process.
+
+    """
+    if refresh or PrefProxy.deferred_load is not None:
+        # Deferred load is done here since it can't be done synchronously on value access.
+        await arefresh_prefs()
+
+    return get_app_values(app)
+
+
+def get_prefs_snapshot() -> Mapping[str, Mapping[str, Any]]:
+    """Returns an immutable snapshot of values of all preferences
+    indexed by application names and preferences names.
+
+    Snapshot is cached until preferences values change.
+
+    """
+    global __SNAPSHOT
+
+    if PrefProxy.deferred_load is not None:
+        PrefProxy.deferred_load()
+
+    values_snapshot, snapshot = __SNAPSHOT
+    values = PrefProxy.values
+
+    if values is not values_snapshot:
+        snapshot = MappingProxyType({
+            app: MappingProxyType(_get_values(prefs, values))
+            for app, prefs in get_prefs().items()
+        })
+        __SNAPSHOT = (values, snapshot)
+
+    return snapshot
+
+
+def pin_prefs_snapshot(snapshot: Optional[Mapping]) -> Any:
+    """Pins preferences snapshot for the current context (e.g. request).
+    Returns a token to be passed to ``unpin_prefs_snapshot()``.
+
+    :param snapshot: Snapshot got from ``get_prefs_snapshot()``.
+
+    """
+    return __REQUEST_SNAPSHOT.set(snapshot)
+
+
+def unpin_prefs_snapshot(token: Any):
+    """Unpins preferences snapshot pinned by ``pin_prefs_snapshot()``.
+
+    :param token:
+
+    """
+    __REQUEST_SNAPSHOT.reset(token)
+
+
+def get_request_prefs(app: str = None) -> Mapping:
+    """Returns preferences values snapshot pinned for the current request
+    (see ``prefs_snapshot_middleware``), or the current snapshot if none is pinned.
+
+    :param app: Application name to return values for. If not set, values for all apps are returned.
+
+    """
+    snapshot = __REQUEST_SNAPSHOT.get()
+
+    if snapshot is None:
+        snapshot = get_prefs_snapshot()
+
+    if app is None:
+        return snapshot
+
+    return snapshot.get(app, MappingProxyType({}))
+
+
 def get_prefs_models() -> Dict[str, Model]:
-    """Returns registered preferences models indexed by application names."""
+    """Returns registered preferences models indexed by application names.
+
+    Registers models deferred by lazy admin mode if any.
+
+    """
+    if __ADMIN_PENDING:
+        register_deferred_admin_models()
+
     return __MODELS_REGISTRY
 
 
+def register_proxy(app: str, proxy: PrefProxy):
+    """Puts a PrefProxy object into preferences registry.
+
+    :param app: Application name.
+
+    :param proxy:
+
+    """
+    prefs = get_prefs()
+
+    if app not in prefs:
+        prefs[app] = OrderedDict()
+
+    prefs[app][proxy.name.lower()] = proxy
+
+
 def bind_proxy(
         values: Union[List, Tuple],
         category: str = None,
@@ -95,22 +608,21 @@ def bind_proxy(
     :param readonly: Make this field read only.
 
     """
-    addrs = OrderedDict()
+    locals_dict = get_frame_locals(3)
 
-    depth = 3
+    # Index of patched locals built once by patch_locals().
+    addrs = locals_dict.get(__PATCHED_LOCALS_SENTINEL)
 
-    for local_name, locals_dict in traverse_local_prefs(depth):
-        addrs[id(locals_dict[local_name])] = local_name
+    if not addrs:  # Locals are not patched, so there is nothing to bind.
+        return []
 
     proxies = []
-    locals_dict = get_frame_locals(depth)
 
     for value in values:  # Try to preserve fields order.
 
-        id_val = id(value)
+        local_name = addrs.get(id(value))
 
-        if id_val in addrs:
-            local_name = addrs[id_val]
+        if local_name is not None:
             local_val = locals_dict[local_name]
 
             if isinstance(local_val, PatchedLocal) and not isinstance(local_val, PrefProxy):
@@ -125,21 +637,94 @@ def bind_proxy(
                     readonly=readonly,
                 )
 
-                app_name = locals_dict['__name__'].split('.')[-2]  # x.y.settings -> y
-                prefs = get_prefs()
-
-                if app_name not in prefs:
-                    prefs[app_name] = OrderedDict()
-
-                prefs[app_name][local_name.lower()] = proxy
+                register_proxy(locals_dict['__name__'].split('.')[-2], proxy)  # x.y.settings -> y
 
                 # Replace original pref variable with a proxy.
                 locals_dict[local_name] = proxy
+                del addrs[id(value)]
                 proxies.append(proxy)
 
     return proxies
 
 
+def bind_module_prefs(
+        module: ModuleType,
+        prefs: Union[Iterable[str], Dict[str, Any]],
+        category: str = None,
+        field: Field = None,
+        verbose_name: str = None,
+        help_text: str = '',
+        static: bool = True,
+        readonly: bool = False,
+        app: str = None,
+) -> List[PrefProxy]:
+    """Binds PrefProxy objects to variables of a given module.
+
+    Unlike ``bind_proxy()`` this requires neither frames inspection
+    nor ``patch_locals()``, so it can be used from factories
+    and for modules constructed by code.
+
+    .. code-block:: python
+
+        module = sys.modules[__name__]
+
+        bind_module_prefs(module, ['MY_OPTION_1', 'MY_OPTION_2'], static=False)
+        bind_module_prefs(module, {'MY_OPTION_42': 42}, category='My Group')
+
+        proxy_module(module)
+
+    :param module: Module holding preferences variables.
+
+    :param prefs: Preferences variables names. If a dictionary of names mapped to values is given,
+        the values are set as module variables.
+
+    :param category: Category name the preference belongs to.
+
+    :param field: Django model field to represent these preferences.
+        Every preference gets its own copy of the field.
+
+    :param verbose_name: Field verbose name.
+
+    :param help_text: Field help text.
+
+    :param static: Leave this preference static (do not store in DB).
+
+    :param readonly: Make this field read only.
+
+    :param app: Application name. If not set, it is deduced from module name (x.y.settings -> y).
+
+    """
+    if app is None:
+        app = module.__name__.split('.')[-2]
+
+    if not isinstance(prefs, dict):
+        prefs = {name: getattr(module, name) for name in prefs}
+
+    proxies = []
+
+    for name, value in prefs.items():
+
+        if isinstance(value, PrefProxy):
+            continue
+
+        proxy = PrefProxy(
+            name, value,
+            category=category,
+            field=None if field is None else field.clone(),
+            verbose_name=verbose_name,
+            help_text=help_text,
+            static=static,
+            readonly=readonly,
+        )
+
+        register_proxy(app, proxy)
+
+        setattr(module, name, proxy)
+        proxies.append(proxy)
+
+    return proxies
+
+
 def register_admin_models(admin_site: AdminSite):
     """Registers dynamically created preferences models for Admin interface.
 
@@ -159,25 +744,86 @@ def register_admin_models(admin_site: AdminSite):
             admin_site.register(model_class, get_pref_model_admin_class(prefs_items))
 
 
-def autodiscover_siteprefs(admin_site: AdminSite = None):
+def defer_admin_models(admin_site: AdminSite):
+    """Defers creation and registration of preferences models for Admin interface
+    until admin site URLs are resolved on URLconf load (see ``register_deferred_admin_models()``).
+
+    :param admin_site: AdminSite object.
+
+    """
+    get_urls = admin_site.get_urls
+
+    def get_urls_registering():
+        register_deferred_admin_models()
+        return get_urls()
+
+    with __ADMIN_LOCK:
+
+        if admin_site in __ADMIN_PENDING:
+            return  # Already deferred.
+
+        admin_site.get_urls = get_urls_registering
+        __ADMIN_PENDING.append(admin_site)
+
+
+def register_deferred_admin_models():
+    """Creates and registers preferences models for Admin interface deferred by lazy admin mode."""
+
+    with __ADMIN_LOCK:
+
+        while __ADMIN_PENDING:
+            admin_site = __ADMIN_PENDING.pop()
+            del admin_site.get_urls  # Restore original method.
+            register_admin_models(admin_site)
+
+
+def autodiscover_siteprefs(
+        admin_site: AdminSite = None,
+        lazy: bool = None,
+        project_package: str = None,
+        lazy_admin: bool = None
+):
     """Automatically discovers and registers all preferences available in all apps.
 
     :param admin_site: Custom AdminSite object.
 
+    :param lazy: Defer reading preferences from DB until the first
+        dynamic preference value access. If not set SITEPREFS_LAZY_LOAD is used.
+
+    :param project_package: Project package name to import project-wide preferences from.
+        If not set, it is deduced using frames inspection.
+
+    :param lazy_admin: Defer creation and registration of preferences models for Admin
+        until URLconf is loaded. If not set SITEPREFS_LAZY_ADMIN is used.
+
     """
-    import_prefs()
+    import_prefs(project_package)
 
-    try:
-        Preference.read_prefs(get_prefs())
+    if lazy is None:
+        lazy = LAZY_LOAD
 
-    except DatabaseError:
-        # This may occur if run from manage.py (or its wrapper) when db is not yet initialized.
-        LOGGER.warning('Unable to read preferences from database. Skip.')
+    if lazy:
+        PrefProxy.deferred_load = load_deferred_prefs
 
     else:
-        if admin_site is None:
-            admin_site = admin.site
+        try:
+            refresh_prefs(force=True)
+
+        except DatabaseError:
+            # This may occur if run from manage.py (or its wrapper) when db is not yet initialized.
+            LOGGER.warning('Unable to read preferences from database. Skip.')
+            return
+
+    if admin_site is None:
+        admin_site = admin.site
+
+    if lazy_admin is None:
+        lazy_admin = LAZY_ADMIN
+
+    if lazy_admin:
+        defer_admin_models(admin_site)
 
+    else:
         register_admin_models(admin_site)
 
 
@@ -186,11 +832,17 @@ def patch_locals(depth: int = 2):
     considered preferences with PatchedLocal objects, so that every
     variable has different hash returned by id().
 
+    Index of patched variables by id() is stored under a sentinel key
+    to be reused by all bind_proxy() calls.
+
     """
+    addrs = {}
+
     for name, locals_dict in traverse_local_prefs(depth):
-        locals_dict[name] = PatchedLocal(name, locals_dict[name])
+        patched = locals_dict[name] = PatchedLocal(name, locals_dict[name])
+        addrs[id(patched)] = name
 
-    get_frame_locals(depth)[__PATCHED_LOCALS_SENTINEL] = True  # Sentinel.
+    get_frame_locals(depth)[__PATCHED_LOCALS_SENTINEL] = addrs  # Sentinel.
 
 
 def unpatch_locals(depth: int = 3):
@@ -207,7 +859,14 @@ def unpatch_locals(depth: int = 3):
 
 
 class ModuleProxy:
-    """Proxy to handle module attributes access."""
+    """Proxy to handle module attributes access.
+
+    Non-preference attributes are served natively from the proxy itself.
+    To reassign such an attribute after proxying set it on the proxy
+    (e.g. ``settings.MY_CONSTANT = 1``), which also sets it on the module.
+    Reassignments made by module code itself (``global`` statement) are not seen.
+
+    """
 
     def __init__(self):
         self._module: Optional[ModuleType] = None
@@ -219,8 +878,12 @@ class ModuleProxy:
         :param prefs: Preference names. Just to speed up __getattr__.
 
         """
-        self._module = module
         self._prefs = set(prefs)
+        self._module = module
+
+        # Non-preference attributes are served natively from the proxy dict,
+        # so that __getattr__ is only called for preferences.
+        self.__dict__.update({name: value for name, value in vars(module).items() if name not in self._prefs})
 
     def __getattr__(self, name: str) -> Any:
 
@@ -230,34 +893,51 @@ class ModuleProxy:
             # It is a PrefProxy
             value = value.value
 
+        else:
+            # Attribute defined after the module was proxied.
+            self.__dict__[name] = value
+
         return value
 
+    def __setattr__(self, name: str, value: Any):
+        module = self.__dict__.get('_module')
 
-def proxy_settings_module(depth: int = 3):
-    """Replaces a settings module with a Module proxy to intercept
-    an access to settings.
+        if module is not None and name not in self._prefs:
+            # Keep module code reading its globals in sync with the proxy.
+            setattr(module, name, value)
 
-    :param depth: Frame count to go backward.
+        super().__setattr__(name, value)
+
+
+def proxy_module(module: ModuleType) -> ModuleProxy:
+    """Replaces a module in ``sys.modules`` with a Module proxy
+    to intercept an access to preferences.
+
+    :param module: Module holding preferences variables.
 
     """
-    proxies = []
+    prefs = [name for name, value in vars(module).items() if isinstance(value, PrefProxy)]
 
-    modules = sys.modules
-    module_name = get_frame_locals(depth)['__name__']
+    module_name = module.__name__
 
-    module_real = modules[module_name]
+    # ModuleType defines its own __setattr__, so ours is set explicitly.
+    new_module = type(module_name, (ModuleType, ModuleProxy), {'__setattr__': ModuleProxy.__setattr__})(module_name)
+    new_module.bind(module, prefs)
 
-    for name, locals_dict in traverse_local_prefs(depth):
+    sys.modules[module_name] = new_module
 
-        value = locals_dict[name]
+    return new_module
 
-        if isinstance(value, PrefProxy):
-            proxies.append(name)
 
-    new_module = type(module_name, (ModuleType, ModuleProxy), {})(module_name)  # ModuleProxy
-    new_module.bind(module_real, proxies)
+def proxy_settings_module(depth: int = 3):
+    """Replaces a settings module with a Module proxy to intercept
+    an access to settings.
 
-    modules[module_name] = new_module
+    :param depth: Frame count to go backward.
+
+    """
+    module_name = get_frame_locals(depth)['__name__']
+    proxy_module(sys.modules[module_name])
 
 
 def register_prefs(*args: PrefProxy, **kwargs):
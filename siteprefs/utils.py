@@ -1,12 +1,17 @@
 
 import inspect
+import logging
 import os
-from collections import OrderedDict
-from datetime import datetime
-from typing import Any, Callable, Type, Generator, Tuple
+from collections import OrderedDict, Counter
+from itertools import count
+from threading import Lock
+from datetime import datetime, time
+from typing import Any, Callable, Type, Generator, Tuple, Optional, Dict, Iterable
 from warnings import warn
 
 from django.contrib import admin
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 from etc.toolbox import import_app_module, import_project_modules
@@ -14,6 +19,12 @@ from etc.toolbox import import_app_module, import_project_modules
 from .settings import PREFS_MODULE_NAME
 from .signals import prefs_save
 
+_UNSET = object()
+_SLOTS = count()
+_PUBLISH_LOCK = Lock()
+
+LOGGER = logging.getLogger(__name__)
+
 
 class Frame:
     """Represents a frame object at a definite level of hierarchy.
@@ -47,17 +58,29 @@ class PatchedLocal:
     considered preferences.
 
     """
+    __slots__ = ('key', 'val')
+
     def __init__(self, key: str, val: Any):
         self.key = key
         self.val = val
 
 
+class PreciseJSONEncoder(DjangoJSONEncoder):
+    """Unlike DjangoJSONEncoder keeps microseconds of datetimes and times."""
+
+    def default(self, o):
+        if isinstance(o, (datetime, time)):
+            return o.isoformat()
+        return super().default(o)
+
+
 class Mimic:
     """Mimics other types by implementation of various special methods.
 
     This one is deprecated if favor of setting module proxying (proxy_settings_module()).
 
     """
+    __slots__ = ()
 
     value: Any = None
 
@@ -122,6 +145,25 @@ class Mimic:
 class PrefProxy(Mimic):
     """Objects of this class replace app preferences."""
 
+    __slots__ = (
+        'name', 'category', 'default', 'static', 'help_text', 'readonly', 'verbose_name', 'field',
+        'slot', '_db_value', '_value',
+    )
+
+    deferred_load: Optional[Callable] = None
+    """Function to load values from DB on the first dynamic value access (lazy mode)."""
+
+    values: Dict[int, Any] = {}
+    """Decoded DB values of preferences indexed by proxies slots.
+
+    Never changed in place: replaced as a whole by publish_values(),
+    so that readers always see a consistent state without locking.
+
+    """
+
+    reads: Optional[Counter] = None
+    """Value reads counter indexed by id() of proxies (see metrics.enable_reads_counting())."""
+
     def __init__(
             self,
             name: str,
@@ -168,6 +210,10 @@ class PrefProxy(Mimic):
 
         self.verbose_name = verbose_name
 
+        self.slot = next(_SLOTS)
+        self._db_value = _UNSET
+        self._value = _UNSET  # Decoded default value cache.
+
         if field is None:
             self.field = get_field_for_proxy(self)
 
@@ -175,20 +221,44 @@ class PrefProxy(Mimic):
             self.field = field
             update_field_from_proxy(self.field, self)
 
+    @property
+    def db_value(self) -> Any:
+        """Value stored in DB."""
+        db_value = self._db_value
+
+        if db_value is _UNSET:
+            raise AttributeError('db_value')
+
+        return db_value
+
+    @db_value.setter
+    def db_value(self, value: Any):
+        publish_values([(self, value)])
+
     @property
     def value(self) -> Any:
 
-        if self.static:
-            val = self.default
+        reads = PrefProxy.reads
 
-        else:
-            try:
-                val = getattr(self, 'db_value')
+        if reads is not None:
+            reads[id(self)] += 1
+
+        if not self.static:
+
+            if PrefProxy.deferred_load is not None:
+                PrefProxy.deferred_load()
+
+            value = PrefProxy.values.get(self.slot, _UNSET)
+
+            if value is not _UNSET:
+                return value
 
-            except AttributeError:
-                val = self.default
+        value = self._value
 
-        return self.field.to_python(val)
+        if value is _UNSET:
+            value = self._value = self.field.to_python(self.default)
+
+        return value
 
     def get_value(self) -> Any:
         warn('Please use .value instead .get_value().', DeprecationWarning, stacklevel=2)
@@ -198,6 +268,51 @@ class PrefProxy(Mimic):
         return f'{self.name} = {self.value}'
 
 
+def get_dynamic_prefs(mem_prefs: dict) -> Dict[str, dict]:
+    """Returns dynamic (non-static) preferences indexed by application names and preferences names.
+    Apps without dynamic preferences are omitted.
+
+    :param mem_prefs: Preferences dictionary indexed by application names and preferences names.
+
+    """
+    dynamic = {}
+
+    for app, prefs in mem_prefs.items():
+        app_dynamic = {pref_name: pref_proxy for pref_name, pref_proxy in prefs.items() if not pref_proxy.static}
+
+        if app_dynamic:
+            dynamic[app] = app_dynamic
+
+    return dynamic
+
+
+def publish_values(updates: Iterable[Tuple[PrefProxy, Any]]):
+    """Sets DB values of preferences and publishes their decoded values
+    at once by replacing PrefProxy.values with an updated copy.
+
+    Values which can't be decoded are logged and skipped,
+    so that such preferences fall back to their defaults.
+
+    :param updates: (proxy, DB value) pairs.
+
+    """
+    with _PUBLISH_LOCK:
+        values = dict(PrefProxy.values)
+
+        for pref_proxy, db_value in updates:
+            pref_proxy._db_value = db_value
+
+            try:
+                values[pref_proxy.slot] = pref_proxy.field.to_python(db_value)
+
+            except (ValidationError, TypeError, ValueError):
+                LOGGER.warning(
+                    'Unable to decode value of %s preference: %r. Default is used.', pref_proxy.name, db_value)
+                values.pop(pref_proxy.slot, None)
+
+        PrefProxy.values = values
+
+
 def get_field_for_proxy(pref_proxy: PrefProxy) -> models.Field:
     """Returns a field object instance for a given PrefProxy object.
 
@@ -263,9 +378,11 @@ def get_pref_model_class(app: str, prefs: dict, get_prefs_func: Callable) -> Typ
 
         app_prefs = self._get_prefs(self._prefs_app)
 
-        for pref in app_prefs.keys():
-            if pref in updated_prefs:
-                app_prefs[pref].db_value = updated_prefs[pref]
+        publish_values([
+            (pref_proxy, updated_prefs[pref_name])
+            for pref_name, pref_proxy in app_prefs.items()
+            if pref_name in updated_prefs
+        ])
 
         self.pk = self._prefs_app  # Make Django 1.7 happy.
         prefs_save.send(sender=self, app=self._prefs_app, updated_prefs=updated_prefs)
@@ -312,14 +429,13 @@ def get_pref_model_admin_class(prefs: dict) -> Type[admin.ModelAdmin]:
 
     model.changelist_view = lambda self, request, **kwargs: self.change_view(request, '', **kwargs)
 
-    model.get_object = lambda self, *args: (
-        self.model(
-            **{
-                field_name: val_proxy.get_value() for field_name, val_proxy in
-                self.model._get_prefs(self.model._prefs_app).items()
-            }
-        )
-    )
+    def get_object(self, *args):
+        from .toolbox import get_prefs_snapshot
+
+        # Values in snapshot are already decoded and cached until preferences change.
+        return self.model(**get_prefs_snapshot().get(self.model._prefs_app, {}))
+
+    model.get_object = get_object
 
     return model
 
@@ -359,20 +475,25 @@ def import_module(package: str, module_name: str):
     import_app_module(package, module_name)
 
 
-def import_prefs():
-    """Imports preferences modules from packages (apps) and project root."""
-    
-    # settings.py locals if autodiscover_siteprefs() is in urls.py
-    settings_locals = get_frame_locals(3)
+def import_prefs(project_package: str = None):
+    """Imports preferences modules from packages (apps) and project root.
+
+    :param project_package: Project package name. If not set, it is deduced using frames inspection.
+
+    """
+    if project_package is None:
+        # settings.py locals if autodiscover_siteprefs() is in urls.py
+        settings_locals = get_frame_locals(3)
 
-    if 'self' not in settings_locals:  # If not SiteprefsConfig.ready()
-        # Try to import project-wide prefs.
+        if 'self' not in settings_locals:  # If not SiteprefsConfig.ready()
+            # Try to import project-wide prefs.
 
-        project_package = settings_locals['__package__']  # Expected project layout introduced in Django 1.4
-        if not project_package:
-            # Fallback to old layout.
-            project_package = os.path.split(os.path.dirname(settings_locals['__file__']))[-1]
+            project_package = settings_locals['__package__']  # Expected project layout introduced in Django 1.4
+            if not project_package:
+                # Fallback to old layout.
+                project_package = os.path.split(os.path.dirname(settings_locals['__file__']))[-1]
 
+    if project_package:
         import_module(project_package, PREFS_MODULE_NAME)
 
     import_project_modules(PREFS_MODULE_NAME)